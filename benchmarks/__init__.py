@@ -0,0 +1,3 @@
+#qEplotのbenchmark
+#  generate.py: QE/Wannier90の出力に似せた合成dataを書く
+#  run.py     : parse, compute, renderの段階ごとに時間を測りjsonに保存する
@@ -0,0 +1,226 @@
+import os
+import numpy as np
+
+#########################
+# ===== Generator ===== #
+#########################
+#QE, Wannier90の出力と同じ書式の合成fileを書く
+#bandはk点ごとにcosの和で作るので, 交差や縮退を含み, Eについて昇順に並ぶ
+
+sizes = {
+    'small':  { 'nbands': 40,  'nk': 400,  'nE': 2000,  'nscf': 50,   'nwf': 16,  'nahc': 1000,  'nat': 8 },
+    'medium': { 'nbands': 160, 'nk': 2000, 'nE': 10000, 'nscf': 500,  'nwf': 64,  'nahc': 5000,  'nat': 32 },
+    'large':  { 'nbands': 480, 'nk': 6000, 'nE': 40000, 'nscf': 5000, 'nwf': 256, 'nahc': 20000, 'nat': 128 },
+}
+
+kpath = [ ('G', [0.0, 0.0, 0.0]), ('X', [0.5, 0.0, 0.0]), ('M', [0.5, 0.5, 0.0]), \
+          ('G', [0.0, 0.0, 0.0]), ('R', [0.5, 0.5, 0.5]) ]
+
+def kpath_coords(nk):
+    #高対称点間の距離に比例してk点を割り振る
+    points = np.array([ p for _, p in kpath ])
+    dist = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))])
+    return np.linspace(0, dist[-1], nk), dist
+
+def synthetic_bands(nbands, nk, seed=0):
+    #return: kaxis(nk), energies(nbands, nk), efは0付近
+    rng = np.random.default_rng(seed)
+    kaxis, _ = kpath_coords(nk)
+    x = kaxis / kaxis[-1] * 2 * np.pi
+    center = np.linspace(-0.6, 0.6, nbands)[:, None] * nbands / 4
+    width = rng.uniform(0.5, 3.0, (nbands, 1))
+    phase = rng.uniform(0, 2*np.pi, (nbands, 3))
+    energies = center + width * (np.cos(x + phase[:, :1]) + 0.5 * np.cos(3*x + phase[:, 1:2]) \
+                                 + 0.2 * np.cos(7*x + phase[:, 2:]))
+    return kaxis, np.sort(energies, axis=0)
+
+def write_band_table(file_band, kaxis, energies, weights=None):
+    #band.gnu: "k E", _band.dat: "k E weight", bandごとに空行で区切る
+    with open(file_band, 'w') as f_band:
+        for n, ene in enumerate(energies):
+            if weights is None:
+                block = np.column_stack([kaxis, ene])
+                np.savetxt(f_band, block, fmt='%10.4f%10.4f')
+            else:
+                block = np.column_stack([kaxis, ene, weights[n]])
+                np.savetxt(f_band, block, fmt='%12.6f%14.6f%12.6f')
+            f_band.write("\n")
+
+def write_nscf_in(file_nscf_in, prefix, nk):
+    with open(file_nscf_in, 'w') as f_nscf_in:
+        f_nscf_in.write(" &control\n    calculation = 'bands'\n    prefix = '{}'\n /\n".format(prefix))
+        f_nscf_in.write(" &system\n    ibrav = 1\n /\n &electrons\n /\n")
+        f_nscf_in.write("K_POINTS crystal_b\n{}\n".format(len(kpath)))
+        for name, p in kpath:
+            f_nscf_in.write("  {:.4f} {:.4f} {:.4f} {} !{}\n".format(*p, nk // len(kpath), name))
+
+def write_band_out(file_band_out, nk):
+    _, dist = kpath_coords(nk)
+    with open(file_band_out, 'w') as f_band_out:
+        f_band_out.write("     Program BANDS\n\n")
+        for (_, p), x in zip(kpath, dist):
+            f_band_out.write("     high-symmetry point:  {:.4f} {:.4f} {:.4f}   x coordinate   {:.4f}\n".format(*p, x))
+
+def write_labelinfo(file_labelinfo, nk):
+    _, dist = kpath_coords(nk)
+    index = np.round(dist / dist[-1] * (nk-1)).astype(int) + 1
+    with open(file_labelinfo, 'w') as f_labelinfo:
+        for (name, p), i, x in zip(kpath, index, dist):
+            f_labelinfo.write("{:>3} {:6d} {:16.10f} {:16.10f} {:16.10f} {:16.10f}\n".format(name, i, x, *p))
+
+def write_pdos_tot(file_pdos_tot, nE, nspin=1, seed=0):
+    rng = np.random.default_rng(seed)
+    E = np.linspace(-20, 10, nE)
+    peaks = rng.uniform(-18, 8, 60)
+    dos = np.exp(-((E[:, None] - peaks[None, :]) / 0.3)**2).sum(axis=1)
+    with open(file_pdos_tot, 'w') as f_pdos:
+        if nspin == 1:
+            f_pdos.write("# E (eV)  dos(E)    pdos(E)\n")
+            np.savetxt(f_pdos, np.column_stack([E, dos, 0.9*dos]), fmt='%8.3f%12.3E%12.3E')
+        else:
+            f_pdos.write("# E (eV)  dosup(E)   dosdw(E)  pdosup(E)  pdosdw(E)\n")
+            np.savetxt(f_pdos, np.column_stack([E, dos, 0.8*dos, 0.9*dos, 0.7*dos]), fmt='%8.3f' + '%12.3E'*4)
+
+def write_pdos_atm(dir, prefix, nat, nE, seed=0):
+    #2元素, 原子ごとにs, p(d)のfileを書く. return: file名のlist
+    rng = np.random.default_rng(seed)
+    E = np.linspace(-20, 10, nE)
+    files = []
+    for n in range(1, nat+1):
+        element, orbitals = ('Fe', ['s', 'd']) if n <= nat // 2 else ('O', ['s', 'p'])
+        for m, l in enumerate(orbitals, 1):
+            file = os.path.join(dir, "{}.pdos_atm#{}({})_wfc#{}({})".format(prefix, n, element, m, l))
+            peaks = rng.uniform(-18, 8, 5)
+            ldos = np.exp(-((E[:, None] - peaks[None, :]) / 0.3)**2).sum(axis=1)
+            with open(file, 'w') as f_pdos:
+                f_pdos.write("# E (eV)  ldos(E)   pdos(E)\n")
+                np.savetxt(f_pdos, np.column_stack([E, ldos, ldos]), fmt='%8.3f%11.3E%11.3E')
+            files.append(file)
+    return files
+
+def write_scf_out(file_scf_out, niter, nat=8, ef=12.3456, magnetic=True):
+    #scfのiterationごとにenergyとmagnetizationを書き, 最後に収束後の"!"とFermi energyを書く
+    with open(file_scf_out, 'w') as f_scf_out:
+        f_scf_out.write("     Program PWSCF v.7.2 starts on  1Jan2025 at  0: 0: 0\n\n")
+        for it in range(1, niter+1):
+            f_scf_out.write("     iteration #{:3d}     ecut=    60.00 Ry     beta= 0.30\n".format(it))
+            f_scf_out.write("     Davidson diagonalization with overlap\n")
+            for n in range(nat):
+                f_scf_out.write("     atom:{:4d}    charge:  7.{:04d}    magn:  2.{:04d}    constr:    0.0000\n".format(n+1, it % 10000, n))
+            f_scf_out.write("\n     total cpu time spent up to now is {:10.1f} secs\n\n".format(it * 1.5))
+            f_scf_out.write("     total energy              =   {:.8f} Ry\n".format(-1234.5 - 1.0/it))
+            f_scf_out.write("     estimated scf accuracy    <       {:.8f} Ry\n".format(1.0/it**2))
+            if magnetic:
+                f_scf_out.write("\n     total magnetization       =     {:.2f} Bohr mag/cell\n".format(2.0 + 1.0/it))
+                f_scf_out.write("     absolute magnetization    =     {:.2f} Bohr mag/cell\n\n".format(2.2 + 1.0/it))
+        f_scf_out.write("     End of self-consistent calculation\n\n")
+        f_scf_out.write("     the Fermi energy is    {:.4f} ev\n\n".format(ef))
+        f_scf_out.write("!    total energy              =   {:.8f} Ry\n".format(-1234.5 - 1.0/niter))
+        f_scf_out.write("     estimated scf accuracy    <       {:.8f} Ry\n".format(1.0/niter**2))
+        if magnetic:
+            f_scf_out.write("\n     total magnetization       =     {:.2f} Bohr mag/cell\n".format(2.0 + 1.0/niter))
+            f_scf_out.write("     absolute magnetization    =     {:.2f} Bohr mag/cell\n\n".format(2.2 + 1.0/niter))
+        f_scf_out.write("     convergence has been achieved in {:3d} iterations\n\n".format(niter))
+        f_scf_out.write("     JOB DONE.\n")
+
+def write_wout(file_wout, nwf, niter, seed=0):
+    rng = np.random.default_rng(seed)
+    centre = rng.uniform(-3, 3, (nwf, 3))
+    labels = [ "Fe d_xy", "Fe d_yz", "Fe d_z2", "O p_x", "O p_y", "" ]
+    with open(file_wout, 'w') as f_wout:
+        f_wout.write(" +--------------------------------------------------+\n |  Wannier90  |\n")
+        for it in range(niter+1):
+            if it == niter: f_wout.write("\n Final State\n")
+            else:           f_wout.write("\n Cycle: {:6d}\n".format(it))
+            for n in range(nwf):
+                c = centre[n] + 0.01 / (it+1)
+                label = labels[n % len(labels)] if it == niter else ""
+                f_wout.write("  WF centre and spread {:4d}  ( {:10.6f}, {:10.6f}, {:10.6f} ) {:14.8f}  {}\n".format(n+1, *c, 2.0 + 1.0/(it+1), label))
+            f_wout.write("  Sum of centres and spreads ( {:10.6f}, {:10.6f}, {:10.6f} ) {:14.8f}\n".format(0, 0, 0, 2.0*nwf))
+        f_wout.write("\n All done: wannier90 exiting\n")
+
+def projwfc_states(nat):
+    #write_pdos_atmと同じ2元素, Feはs, d, Oはs, p. return: [(atom, element, wfc, l, m), ...]
+    states = []
+    for n in range(1, nat+1):
+        element, ls = ('Fe', [0, 2]) if n <= nat // 2 else ('O', [0, 1])
+        for wfc, l in enumerate(ls, 1):
+            states += [ (n, element, wfc, l, m) for m in range(1, 2*l+2) ]
+    return states
+
+def write_projwfc_out(file_projwfc, energies, nat, nterm=4, seed=0):
+    #k-resolvedのprojwfc.x出力, bandごとにnterm個のstateへの射影を2行に分けて書く
+    rng = np.random.default_rng(seed)
+    states = projwfc_states(nat)
+    nbands, nk = energies.shape
+    kvec = np.column_stack([ np.linspace(0, 0.5, nk), np.zeros(nk), np.zeros(nk) ])
+    with open(file_projwfc, 'w') as f_projwfc:
+        f_projwfc.write("     Program PROJWFC v.7.2 starts on  1Jan2025 at  0: 0: 0\n\n")
+        f_projwfc.write("     Problem Sizes \n     natomwfc =  {:10d}\n     nbnd     =  {:10d}\n     nkstot   =  {:10d}\n\n".format(len(states), nbands, nk))
+        f_projwfc.write("     Atomic states used for expansion\n     (read from pseudopotential files):\n")
+        for i, (n, element, wfc, l, m) in enumerate(states, 1):
+            f_projwfc.write("     state #{:4d}: atom {:3d} ({:<3}), wfc {:2d} (l={} m={:2d})\n".format(i, n, element, wfc, l, m))
+        for k in range(nk):
+            idx = rng.integers(1, len(states)+1, (nbands, nterm))
+            coef = rng.random((nbands, nterm))
+            coef = coef / coef.sum(axis=1, keepdims=True) * 0.95
+            block = [ "\n k = {:14.10f}{:14.10f}{:14.10f}\n".format(*kvec[k]) ]
+            for n in range(nbands):
+                terms = [ "{:.3f}*[#{:4d}]".format(c, i) for c, i in zip(coef[n], idx[n]) ]
+                block.append("==== e({:4d}) = {:11.5f} eV ==== \n     psi = {}+\n           +{}\n    |psi|^2 = {:.3f}\n\n".format( \
+                             n+1, energies[n, k], "+".join(terms[:-1]), terms[-1], coef[n].sum()))
+            f_projwfc.write("".join(block))
+        f_projwfc.write("\n Lowdin Charges: \n\n")
+        for n in range(1, nat+1):
+            f_projwfc.write("     Atom #{:4d}: total charge =   7.9000, s =  0.6000, \n".format(n))
+        f_projwfc.write("\n     JOB DONE.\n")
+
+def write_ahc_fermiscan(file_ahc, nE, seed=0):
+    #berry.fのfermiscan出力: Ef, AHC_x, AHC_y, AHC_z (S/cm)
+    rng = np.random.default_rng(seed)
+    E = np.linspace(10.0, 15.0, nE)
+    peaks = rng.uniform(10, 15, (3, 20))
+    ahc = [ (200 * np.tanh((E[:, None] - p[None, :]) / 0.05)).sum(axis=1) for p in peaks ]
+    np.savetxt(file_ahc, np.column_stack([E] + ahc), fmt='%16.8f')
+
+def make_dataset(root, size='small', prefix='bench'):
+    #root以下にqe/, w90/, pjband/, anc/を作り, 書いたfileを返す
+    p = sizes[size]
+    #band fileのEは絶対値なので, scf.outのFermi energyだけずらして書く
+    ef = 12.3456
+    kaxis, energies = synthetic_bands(p['nbands'], p['nk'])
+    energies = energies + ef
+    files = {}
+    for sub in ('qe', 'w90', 'pjband', 'anc'):
+        os.makedirs(os.path.join(root, sub), exist_ok=True)
+    qe = os.path.join(root, 'qe', prefix)
+    write_scf_out(qe + '.scf.out', p['nscf'], p['nat'], ef)
+    write_nscf_in(qe + '.nscf.in', prefix, p['nk'])
+    write_band_out(qe + '.band.out', p['nk'])
+    write_band_table(qe + '.band.gnu', kaxis, energies)
+    write_pdos_tot(qe + '.pdos_tot', p['nE'])
+    files['pdos_atm'] = write_pdos_atm(os.path.join(root, 'qe'), prefix, p['nat'], p['nE'])
+    write_projwfc_out(qe + '.projwfc.out', energies, p['nat'])
+    w90 = os.path.join(root, 'w90', prefix)
+    write_scf_out(w90 + '.scf.out', p['nscf'], p['nat'], ef)
+    write_labelinfo(w90 + '_band.labelinfo.dat', p['nk'])
+    write_band_table(w90 + '_band.dat', kaxis, energies[::2][:p['nwf']])
+    write_wout(w90 + '.wout', p['nwf'], p['nscf'])
+    pj = os.path.join(root, 'pjband')
+    write_scf_out(os.path.join(pj, prefix + '.scf.out'), p['nscf'], p['nat'], ef)
+    write_labelinfo(os.path.join(pj, prefix + '_band.labelinfo.dat'), p['nk'])
+    write_wout(os.path.join(pj, prefix + '.wout'), min(p['nwf'], 24), 10)
+    wfbands = energies[::2][:min(p['nwf'], 24)]
+    rng = np.random.default_rng(1)
+    for n in range(min(p['nwf'], 24)):
+        write_band_table(os.path.join(pj, "WF{}_band.dat".format(n+1)), kaxis, wfbands, \
+                         rng.random(wfbands.shape))
+    write_ahc_fermiscan(os.path.join(root, 'anc', prefix + '-ahc-fermiscan.dat'), p['nahc'])
+    files.update({ 'qe': os.path.join(root, 'qe'), 'w90': os.path.join(root, 'w90'), \
+                   'pjband': pj, 'anc': os.path.join(root, 'anc'), \
+                   'scf_out': qe + '.scf.out', 'band_gnu': qe + '.band.gnu', \
+                   'nscf_in': qe + '.nscf.in', 'band_out': qe + '.band.out', \
+                   'pdos_tot': qe + '.pdos_tot', 'projwfc': qe + '.projwfc.out', 'band_dat': w90 + '_band.dat', \
+                   'labelinfo': w90 + '_band.labelinfo.dat', 'wout': w90 + '.wout', \
+                   'ahc': os.path.join(root, 'anc', prefix + '-ahc-fermiscan.dat') })
+    return files
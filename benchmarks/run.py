@@ -0,0 +1,334 @@
+
+"""
+Usage:
+  run.py [-s <size>] [-r <repeat>] [-k <filter>] [-o <json>] [-w <workdir>]
+  run.py compare <old_json> <new_json>
+
+Options:
+  -s <size>        合成dataの大きさ, small, medium, large  [default: small]
+  -r <repeat>      各benchmarkの繰り返し回数, 最速と平均を記録  [default: 3]
+  -k <filter>      名前にfilterを含むbenchmarkだけ実行  [default: ]
+  -o <json>        結果の出力先, 指定しないとbenchmarks/results/<size>-<日時>.json  [default: ]
+  -w <workdir>     合成dataを書くdir, 指定しないと一時dir(終了時に消す)  [default: ]
+  compare          2つの結果jsonを並べて比(new/old)を出す
+"""
+
+from docopt import docopt
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import platform
+import tempfile
+import subprocess
+import numpy as np
+
+import qEplot.readdata as rd
+import qEplot.cache as cache
+from benchmarks.generate import sizes, make_dataset
+
+#arkiv/ANCcalcはpackageではないのでpathを通す
+anc_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'qEplot', 'arkiv', 'ANCcalc')
+
+#########################
+# ===== Benchmark ===== #
+#########################
+#stage: startup(import, --help), parse(text->array, cacheは無効), compute(読み込み済みdataの計算), render(pdfの書き出し)
+#各benchmarkは files を受け取り, 計測する関数を返す(準備はここで済ませる)
+#plottool等が無ければImportErrorになり, skippedとして記録する. それ以外の例外はerrorとして記録し次へ進む
+
+benchmarks = []
+
+def benchmark(name, stage):
+    def deco(func):
+        benchmarks.append((name, stage, func))
+        return func
+    return deco
+
+#----- startup -----#
+#新しいpythonでimportだけの時間を測る. 描画しない経路でmatplotlib, plottoolが読み込まれたらerrorにする
+heavy_modules = ('matplotlib', 'plottool')
+startup_scripts = {
+    'import_qEplot': "import qEplot",
+    'read_wout_import': "from qEplot import read_wout",
+    'qb_help': "from qEplot.banddos_plot import bandplot\nsys.argv = ['qb', '--help']\ntry: bandplot()\nexcept SystemExit: pass",
+    'qbp_pdf_help': "from qEplot.banddos_plot_pdf import banddosplot\nsys.argv = ['qbp-pdf', '--help']\ntry: banddosplot()\nexcept SystemExit: pass",
+    'pjband_help': "from qEplot.projband_plot import bandplot\nsys.argv = ['pjband', '--help']\ntry: bandplot()\nexcept SystemExit: pass",
+}
+
+def startup_benchmark(name, script):
+    def setup(files):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([root] + [os.environ.get('PYTHONPATH', '')]))
+        check = "\nprint('@heavy', ','.join(m for m in sys.modules if m.split('.')[0] in {}))".format(heavy_modules)
+        def run():
+            proc = subprocess.run([sys.executable, '-c', "import sys\n" + script + check], env=env, \
+                                  capture_output=True, text=True)
+            if proc.returncode != 0: raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+            heavy = proc.stdout.strip().splitlines()[-1].replace('@heavy', '').strip()
+            if heavy: raise RuntimeError("startup imported {}".format(heavy))
+        return run
+    benchmarks.append((name, 'startup', setup))
+
+for name, script in startup_scripts.items(): startup_benchmark(name, script)
+
+#----- parse -----#
+@benchmark('band_gnu', 'parse')
+def bench_band_gnu(files):
+    return lambda: rd.read_band_table(files['band_gnu'])
+
+@benchmark('band_dat', 'parse')
+def bench_band_dat(files):
+    return lambda: rd.read_band_table(files['band_dat'])
+
+@benchmark('labelinfo', 'parse')
+def bench_labelinfo(files):
+    return lambda: rd.read_labelinfo(files['labelinfo'])
+
+@benchmark('pdos_tot', 'parse')
+def bench_pdos_tot(files):
+    return lambda: rd.read_pdos_columns([[files['pdos_tot'], 0, 2], [files['pdos_tot'], 0, 1]])
+
+@benchmark('pdos_atm', 'parse')
+def bench_pdos_atm(files):
+    return lambda: rd.aggregate_pdos_atm(*sorted(files['pdos_atm']))
+
+@benchmark('scf_out', 'parse')
+def bench_scf_out(files):
+    return lambda: rd.read_scf_out(files['scf_out'])
+
+@benchmark('scf_out_forward', 'parse')
+def bench_scf_out_forward(files):
+    #逆読みとの比較用, 先頭から全行を読む
+    def run():
+        with open(files['scf_out'], 'rb') as f_scf_out:
+            return rd._scan_scf_forward(f_scf_out)
+    return run
+
+@benchmark('wout', 'parse')
+def bench_wout(files):
+    return lambda: rd.read_wout_final(files['wout'])
+
+@benchmark('projwfc', 'parse')
+def bench_projwfc(files):
+    #cacheを通さずに1回読み切る時間
+    return lambda: rd._read_projwfc(files['projwfc'], ['Fe:d', 'O:p', 's'])
+
+@benchmark('band_tail_append', 'parse')
+def bench_band_tail(files):
+    #--watch: 全体を1回読んだ後, 1band分の追記だけを読む時間(file全体の大きさによらない)
+    from qEplot.tail import BandTail
+    #datasetのqe/に置くとdiscoveryに拾われるので, 終了時に消すscratchに書く
+    file_tail = os.path.join(files['scratch'], os.path.basename(files['band_gnu']))
+    shutil.copy(files['band_gnu'], file_tail)
+    with open(files['band_gnu'], 'rb') as f_band:
+        block = f_band.read().split(b'\n\n')[0] + b'\n\n'
+    bt = BandTail(file_tail)
+    bt.poll()
+    def run():
+        with open(file_tail, 'ab') as f_tail:
+            f_tail.write(block)
+        bt.poll()
+    return run
+
+@benchmark('scf_history', 'parse')
+def bench_scf_history(files):
+    #qe-scfmon: scf.out全体からiterationごとの値を作る時間
+    from qEplot.tail import ScfHistory
+    def run():
+        ScfHistory(files['scf_out']).poll()
+    return run
+
+@benchmark('QeBand', 'parse')
+def bench_qeband(files):
+    from qEplot.readdata import QeBand
+    return lambda: QeBand(0.0, files['nscf_in'], files['band_out'], files['band_gnu'])
+
+@benchmark('WannierBand', 'parse')
+def bench_wannierband(files):
+    from qEplot.readdata import WannierBand
+    return lambda: WannierBand(0.0, files['labelinfo'], files['band_dat'])
+
+@benchmark('ahc_fermiscan', 'parse')
+def bench_ahc(files):
+    return lambda: np.loadtxt(files['ahc'])
+
+#----- compute -----#
+@benchmark('band_values', 'compute')
+def bench_band_values(files):
+    kaxis, energies, _ = rd.read_band_table(files['band_gnu'])
+    return lambda: rd.band_segments(rd.band_values(kaxis, energies))
+
+@benchmark('energy_index', 'compute')
+def bench_energy_index(files):
+    _, energies, _ = rd.read_band_table(files['band_gnu'])
+    return lambda: rd.EnergyIndex(energies).select(-1.0, 1.0)
+
+@benchmark('decimate', 'compute')
+def bench_decimate(files):
+    from qEplot.bandlines import decimate_segments
+    kaxis, energies, _ = rd.read_band_table(files['band_gnu'])
+    segments = rd.band_segments(rd.band_values(kaxis, energies))
+    #nk <= 4*nbucketだと間引かないので, bucketはk点の1/8
+    return lambda: decimate_segments(segments, max(1, len(kaxis) // 8), 0.002)
+
+@benchmark('band_deviation', 'compute')
+def bench_band_deviation(files):
+    from qEplot.bandcompare import band_deviation
+    qb = rd.QeBand(0.0, files['nscf_in'], files['band_out'], files['band_gnu'])
+    wb = rd.WannierBand(0.0, files['labelinfo'], files['band_dat'])
+    return lambda: band_deviation(qb, wb, (2.0, 2.0))
+
+def _ahc(files):
+    sys.path.insert(0, anc_dir)
+    import anccalc
+    table = np.loadtxt(files['ahc'])
+    return anccalc, table[:, 0] - table[len(table)//2, 0], -table[:, 3]
+
+@benchmark('calc_anc', 'compute')
+def bench_calc_anc(files):
+    anccalc, Ene, AHC = _ahc(files)
+    return lambda: anccalc.calc_anc(Ene, AHC, 300.0)
+
+@benchmark('calc_anc_fft', 'compute')
+def bench_calc_anc_fft(files):
+    anccalc, Ene, AHC = _ahc(files)
+    return lambda: anccalc.calc_anc_fft(Ene, AHC, 300.0)
+
+@benchmark('sweep_anc', 'compute')
+def bench_sweep_anc(files):
+    anccalc, Ene, AHC = _ahc(files)
+    return lambda: anccalc.sweep_anc(Ene, AHC, np.arange(20, 440, 20), processes=1)
+
+@benchmark('anc_store_hit', 'compute')
+def bench_anc_store_hit(files):
+    #ancplot 2回目: 計算済みの温度をstoreから読むだけ(source fileのhashを含む)
+    anccalc, Ene, AHC = _ahc(files)
+    store = os.path.join(files['anc'], 'bench_anc')
+    Tlist = np.arange(20, 440, 20)
+    anccalc.anc_from_store(store, files['ahc'], 'z', 0.0, Ene, AHC, Tlist, processes=1)
+    return lambda: anccalc.anc_from_store(store, files['ahc'], 'z', 0.0, Ene, AHC, Tlist, processes=1)
+
+#----- render -----#
+def pdf_args(dir, outdir, fmt='pdf', rasterize=None):
+    return { '<dir>': dir, '-d': [], '-p': "bench", '-s': outdir, '-c': 'rainbow', \
+             '-e': '1-4-4', '-o': '0.0', '-j': '1', '--lod-tol': '0.002', \
+             '--no-lod': False, '--no-cache': True, '--pdos-by': None, \
+             '-f': fmt, '--dpi': '200', '--rasterize': rasterize, \
+             '--profile': False, '--profile-json': None }
+
+@benchmark('qb_pdf', 'render')
+def bench_qb_pdf(files):
+    import qEplot.banddos_plot_pdf as bdp
+    return lambda: bdp.bandplot(pdf_args(files['qe'], files['out']))
+
+@benchmark('qbp_pdf', 'render')
+def bench_qbp_pdf(files):
+    import qEplot.banddos_plot_pdf as bdp
+    return lambda: bdp.banddosplot(pdf_args(files['qe'], files['out']))
+
+@benchmark('qb_pdf_rasterized', 'render')
+def bench_qb_pdf_rasterized(files):
+    import qEplot.banddos_plot_pdf as bdp
+    return lambda: bdp.bandplot(pdf_args(files['qe'], files['out'], rasterize='300'))
+
+@benchmark('qb_png', 'render')
+def bench_qb_png(files):
+    import qEplot.banddos_plot_pdf as bdp
+    return lambda: bdp.bandplot(pdf_args(files['qe'], files['out'], fmt='png'))
+
+@benchmark('wb_pdf', 'render')
+def bench_wb_pdf(files):
+    import qEplot.banddos_plot_pdf as bdp
+    return lambda: bdp.bandplot(pdf_args(files['w90'], files['out']))
+
+
+def timeit(func, repeat):
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, \
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+def run_all(files, repeat, filter=""):
+    results = []
+    for name, stage, setup in benchmarks:
+        if filter not in name and filter != stage: continue
+        entry = { 'name': name, 'stage': stage }
+        try:
+            func = setup(files)
+            times = timeit(func, repeat)
+            entry.update({ 'best': min(times), 'mean': sum(times)/len(times), 'repeat': repeat })
+        except ImportError as err:
+            entry['skipped'] = "{}: {}".format(type(err).__name__, err)
+        except Exception as err:
+            entry['error'] = "{}: {}".format(type(err).__name__, err)
+        results.append(entry)
+        if 'skipped' in entry: print("{:>8}  {:<18} skipped ({})".format(stage, name, entry['skipped']))
+        elif 'error' in entry: print("{:>8}  {:<18} failed ({})".format(stage, name, entry['error']))
+        else: print("{:>8}  {:<18} {:10.4f}s  (mean {:.4f}s)".format(stage, name, entry['best'], entry['mean']), flush=True)
+    return results
+
+def compare(file_old, file_new):
+    with open(file_old, 'r') as f_old:
+        old = { r['name']: r for r in json.load(f_old)['results'] }
+    with open(file_new, 'r') as f_new:
+        new = json.load(f_new)['results']
+    print("{:>8}  {:<18} {:>10} {:>10} {:>7}".format("stage", "name", "old[s]", "new[s]", "ratio"))
+    for r in new:
+        o = old.get(r['name'], {})
+        if 'best' not in r or 'best' not in o: continue
+        print("{:>8}  {:<18} {:10.4f} {:10.4f} {:7.2f}".format(r['stage'], r['name'], o['best'], r['best'], r['best']/o['best']))
+
+def main():
+    args = docopt(__doc__)
+    if args['compare']:
+        compare(args['<old_json>'], args['<new_json>'])
+        return
+    size = args['-s']
+    if size not in sizes:
+        print("size must be one of {}".format(", ".join(sizes)))
+        return 1
+    #parseは毎回textから読む時間を測る
+    cache.enabled = False
+
+    workdir = args['-w'] or tempfile.mkdtemp(prefix='qeplot-bench-')
+    #scratch: benchmark中に書き換えるfile, -wでも残さない
+    scratch = tempfile.mkdtemp(prefix='qeplot-scratch-')
+    try:
+        start = time.perf_counter()
+        files = make_dataset(workdir, size)
+        files['out'] = os.path.join(workdir, 'out')
+        files['scratch'] = scratch
+        os.makedirs(files['out'], exist_ok=True)
+        print("dataset {} -> {} ({:.1f}s)".format(size, workdir, time.perf_counter() - start))
+        results = run_all(files, int(args['-r']), args['-k'])
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+        if not args['-w']: shutil.rmtree(workdir, ignore_errors=True)
+
+    record = { 'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'commit': git_commit(), \
+               'python': platform.python_version(), 'numpy': np.__version__, \
+               'machine': platform.machine(), 'cpus': os.cpu_count(), \
+               'size': size, 'params': sizes[size], 'results': results }
+    file_json = args['-o']
+    if file_json == "":
+        resultdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+        os.makedirs(resultdir, exist_ok=True)
+        file_json = os.path.join(resultdir, "{}-{}.json".format(size, time.strftime('%Y%m%d-%H%M%S')))
+    with open(file_json, 'w') as f_json:
+        json.dump(record, f_json, indent=1)
+    print("-> {}".format(file_json))
+
+if __name__=='__main__': sys.exit(main())
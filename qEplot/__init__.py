@@ -1,2 +1,16 @@
-from qEplot.banddos_plot import QeBand, WannierBand, Dos
-from qEplot.projband_plot import read_wout
+#QeBand等は最初に参照されたときにimportする (import qEplotでmatplotlibを読み込まない)
+_lazy = { 'BandStructure': 'qEplot.readdata', 'QeBand': 'qEplot.readdata', 'WannierBand': 'qEplot.readdata', \
+          'Dos': 'qEplot.readdata', 'read_wout': 'qEplot.readdata' }
+
+__all__ = list(_lazy)
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError("module 'qEplot' has no attribute '{}'".format(name))
+    import importlib
+    value = getattr(importlib.import_module(_lazy[name]), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
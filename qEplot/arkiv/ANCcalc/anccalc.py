@@ -0,0 +1,174 @@
+import os
+import json
+import hashlib
+import numpy as np
+from scipy.constants import k, e
+from scipy.signal import fftconvolve
+from concurrent.futures import ProcessPoolExecutor
+
+cosh_cutoff=200
+mesh_num=10000
+#一度に積分するmuの数, (mu_chunk, mesh_num)の配列を作るのでmemoryはこれで決まる
+mu_chunk=256
+
+
+def ahc_interp(Ene, AHC, ep):
+    #Ene(昇順)上のAHCをepに線形内挿する
+    #Eneの範囲外は端の傾きで伸ばし, 距離Lで指数的に収束させる
+    Ene = np.asarray(Ene, dtype=np.float64)
+    AHC = np.asarray(AHC, dtype=np.float64)
+    #LはAHCの外挿の収束距離, 端のデータ点の振る舞いが変わる
+    L = (Ene[1]-Ene[0])*5
+    n = len(Ene)
+    #i: ep < Ene[i]となる最初のi (なければn)
+    i = np.searchsorted(Ene, ep, side='right')
+    lo = np.clip(i, 1, n-1)
+    a = (AHC[lo]-AHC[lo-1])/(Ene[lo]-Ene[lo-1])
+    sgm = AHC[lo-1] + a*(ep-Ene[lo-1])
+
+    left = (i == 0)
+    d = Ene[0]-ep[left]
+    sgm[left] = AHC[0] - a[left]*d*np.exp(-d/L)
+    right = (i == n)
+    d = ep[right]-Ene[n-1]
+    sgm[right] = AHC[n-1] + a[right]*d*np.exp(-d/L)
+    return sgm
+
+def anc_kernel(T):
+    #ep_mu: ε-μ のこと
+    #分母のcoshの中身がcutoffを超えると全体として小さいため、積分計算に含めない
+    beta=1/(k*T)
+    ep_mu_max=((cosh_cutoff/beta)/e)
+    ep_step=ep_mu_max*2/mesh_num
+    ep_mu_mesh=np.arange(-1*ep_mu_max, ep_mu_max, ep_step)
+    df_dep_mesh=-1/(2+2*np.cosh(beta*e*ep_mu_mesh))
+    return ep_mu_mesh, df_dep_mesh, ep_step
+
+def calc_anc(Ene, AHC, T):
+    #全てのmuについてまとめて積分する
+    #sgm_meshはmuを中心としたcosh_cutoffを満たす範囲内をmesh_num点に分割した点でのAHC
+    #ANC(mu) = Σ sgm(mu+ep_mu) * ep_mu * df/dep * ep_step * beta/T * 100e
+    Ene = np.asarray(Ene, dtype=np.float64)
+    beta=1/(k*T)
+    ep_mu_mesh, df_dep_mesh, ep_step = anc_kernel(T)
+    weight = ep_mu_mesh*df_dep_mesh
+
+    ANC = np.empty(len(Ene))
+    for s in range(0, len(Ene), mu_chunk):
+        mu = Ene[s:s+mu_chunk]
+        sgm_mesh = ahc_interp(Ene, AHC, (mu[:, None]+ep_mu_mesh[None, :]).ravel())
+        ANC[s:s+mu_chunk] = sgm_mesh.reshape(len(mu), -1) @ weight
+    ANC=ANC*ep_step*beta/T
+    ANC=ANC*100*e #eは分子に2つ分母に1つで1つ残る
+    return ANC
+
+def is_uniform(Ene, rtol=1e-3):
+    #fermiscanの出力桁数程度のずれは等間隔とみなす
+    dE = np.diff(np.asarray(Ene, dtype=np.float64))
+    return len(dE) > 1 and dE[0] > 0 and np.allclose(dE, dE.mean(), rtol=rtol, atol=0)
+
+def calc_anc_fft(Ene, AHC, T):
+    #Eneが等間隔(h)のとき, kernelはmuのshiftに対して不変なので
+    #mu scan全体を1回の畳み込み(FFT)で計算する
+    #積分meshはh/p(p:整数)に揃え, 刻みがanc_kernelのep_step以下になるようにとる
+    Ene = np.asarray(Ene, dtype=np.float64)
+    beta=1/(k*T)
+    n = len(Ene)
+    h = (Ene[-1]-Ene[0])/(n-1)
+    ep_mu_max=((cosh_cutoff/beta)/e)
+    ep_step=ep_mu_max*2/mesh_num
+    p = max(1, int(np.ceil(h/ep_step)))
+    step = h/p
+    J = int(ep_mu_max/step)
+    ep_mu_mesh = np.arange(-J, J+1)*step
+    weight = ep_mu_mesh*(-1/(2+2*np.cosh(beta*e*ep_mu_mesh)))
+
+    ep_mesh = Ene[0] + np.arange(-J, (n-1)*p+J+1)*step
+    sgm_mesh = ahc_interp(Ene, AHC, ep_mesh)
+    ANC = fftconvolve(sgm_mesh, weight[::-1], mode='valid')[::p]
+    ANC=ANC*step*beta/T
+    ANC=ANC*100*e
+    return ANC
+
+def _calc_anc_T(args):
+    Ene, AHC, T, use_fft = args
+    if use_fft: return calc_anc_fft(Ene, AHC, T)
+    return calc_anc(Ene, AHC, T)
+
+def sweep_anc(Ene, AHC, Tlist, processes=None, fft=True):
+    #複数温度のANCをprocess poolで並列に計算する, return: (nT, nE)
+    #等間隔gridならFFT, そうでなければcalc_ancで直接積分
+    Ene = np.asarray(Ene, dtype=np.float64)
+    AHC = np.asarray(AHC, dtype=np.float64)
+    use_fft = fft and is_uniform(Ene)
+    jobs = [ (Ene, AHC, float(T), use_fft) for T in Tlist ]
+    if processes == 1 or len(jobs) == 1:
+        ANC = [ _calc_anc_T(job) for job in jobs ]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            ANC = list(pool.map(_calc_anc_T, jobs))
+    return np.array(ANC).reshape(len(jobs), len(Ene))
+
+#ANCの結果store: <store>/ に ene.npy, ahc.npy, anc.npy((nT, nE)), meta.json を置く
+#npyはnp.loadでmmapして読むので, 温度が多くても開くだけならすぐ終わる
+#meta: ahc-fermiscan.datのhash, axis, ef, 温度のlist(ancの行の順), cosh_cutoff, mesh_num
+#source, axis, ef, cutoff, meshが同じなら, 無い温度だけを計算して行を足す
+
+def source_hash(file):
+    h = hashlib.sha1()
+    with open(file, 'rb') as f_src:
+        for block in iter(lambda: f_src.read(2**20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def read_anc_store(store, mmap=True):
+    #return: meta, Ene, AHC, ANC((nT, nE)), 温度はmeta['T']
+    mode = 'r' if mmap else None
+    with open(os.path.join(store, 'meta.json'), 'r') as f_meta:
+        meta = json.load(f_meta)
+    Ene = np.load(os.path.join(store, 'ene.npy'), mmap_mode=mode)
+    AHC = np.load(os.path.join(store, 'ahc.npy'), mmap_mode=mode)
+    ANC = np.load(os.path.join(store, 'anc.npy'), mmap_mode=mode)
+    return meta, Ene, AHC, ANC
+
+def write_anc_store(store, meta, Ene, AHC, ANC):
+    #npyを一時fileに書いてから置き換え, meta.jsonは最後に書く(途中で止まっても古いmetaでは読めない)
+    os.makedirs(store, exist_ok=True)
+    tmp = '.tmp{}'.format(os.getpid())
+    for name, arr in (('ene', Ene), ('ahc', AHC), ('anc', ANC)):
+        with open(os.path.join(store, name + '.npy' + tmp), 'wb') as f_npy:
+            np.save(f_npy, np.ascontiguousarray(arr, dtype=np.float64))
+    try:
+        os.remove(os.path.join(store, 'meta.json'))
+    except FileNotFoundError:
+        pass
+    for name in ('ene', 'ahc', 'anc'):
+        os.replace(os.path.join(store, name + '.npy' + tmp), os.path.join(store, name + '.npy'))
+    with open(os.path.join(store, 'meta.json' + tmp), 'w') as f_meta:
+        json.dump(meta, f_meta, indent=1)
+    os.replace(os.path.join(store, 'meta.json' + tmp), os.path.join(store, 'meta.json'))
+
+def anc_store_meta(file_ahc_dat, axis, ef, nE):
+    return { 'source': os.path.abspath(file_ahc_dat), 'hash': source_hash(file_ahc_dat), \
+             'axis': axis, 'ef': float(ef), 'nE': int(nE), \
+             'cosh_cutoff': cosh_cutoff, 'mesh_num': mesh_num, 'T': [] }
+
+def _same_source(meta, new):
+    return all( meta.get(key) == new[key] for key in ('hash', 'axis', 'ef', 'nE', 'cosh_cutoff', 'mesh_num') )
+
+def anc_from_store(store, file_ahc_dat, axis, ef, Ene, AHC, Tlist, processes=None, fft=True):
+    #storeにある温度はそのまま読み, 無い温度だけsweep_ancで計算して足す
+    #return: ANC((len(Tlist), nE)), 計算した温度のlist
+    new = anc_store_meta(file_ahc_dat, axis, ef, len(Ene))
+    meta, ANC = new, np.empty((0, len(Ene)))
+    if os.path.isfile(os.path.join(store, 'meta.json')):
+        old, _, _, old_ANC = read_anc_store(store)
+        if _same_source(old, new): meta, ANC = old, old_ANC
+    row = { float(T): i for i, T in enumerate(meta['T']) }
+    missing = [ float(T) for T in Tlist if float(T) not in row ]
+    if len(missing):
+        ANC = np.concatenate([ ANC, sweep_anc(Ene, AHC, missing, processes, fft) ])
+        meta = dict(meta, T=meta['T'] + missing)
+        write_anc_store(store, meta, Ene, AHC, ANC)
+        row = { float(T): i for i, T in enumerate(meta['T']) }
+    return ANC[[ row[float(T)] for T in Tlist ]], missing
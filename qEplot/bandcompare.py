@@ -0,0 +1,172 @@
+
+"""
+Usage:
+  bandcompare.py <dir> [-d <dir2>...] [-w <window>] [-s <SAVE_PATH>] [-p <Prefix>] [--json] [--no-cache] [--profile] [--profile-json <file>]
+
+Options:
+  <dir>            resultの入っているdir
+  -d <dir2>        resultの入っているdir, 追加選択分(複数選択可)
+  -w <window>      比較するEの範囲, efから下-上(eV)を2-2のように指定  [default: 2-2]
+  -s <SAVE_PATH>   jsonの保存先                       [default: ./]
+  -p <Prefix>      物質名, jsonの名前に使う   [default: ]
+  --json           結果を<SAVE_PATH>/<Prefix>_qb-wb.jsonにも書き出す
+  --no-cache       parse結果のcacheを使わない
+  --profile        stageごとの時間とmemoryを表で出力する(QEPLOT_PROFILE=1でも可)
+  --profile-json <file>  stageごとの時間とmemoryをjsonに書き出す
+"""
+
+from docopt import docopt
+import os
+import json
+import numpy as np
+
+import qEplot.readdata as rd
+import qEplot.cache as cache
+from qEplot.readdata import QeBand, WannierBand
+from qEplot.profiler import stage, setup as profile_setup
+from qEplot.discovery import Manifest
+
+###########################
+# ===== BandCompare ===== #
+###########################
+#QEのbandをWannierのk軸(共通のk-grid)に載せ, 各k点でWannierの固有値に最も近いQEの固有値との差をとる
+#差はef基準のE窓[lo, hi]に入るWannierの固有値についてだけ数える
+#描画はしないので, batchでWannier化の良し悪しを数値で並べられる
+
+def map_kaxis(kaxis, kpoints_from, kpoints_to):
+    #高対称点どうしが重なるように区間ごとに線形に写す
+    #高対称点の数が違うときは全長の比で伸縮する
+    kaxis = np.asarray(kaxis, dtype=np.float64)
+    src = np.asarray(kpoints_from, dtype=np.float64)
+    dst = np.asarray(kpoints_to, dtype=np.float64)
+    if len(src) == len(dst) and len(src) > 1 and np.all(np.diff(src) >= 0) and src[-1] > src[0]:
+        return np.interp(kaxis, src, dst)
+    if len(src) == 0 or len(dst) == 0 or src[-1] == 0: return kaxis
+    return kaxis * dst[-1] / src[-1]
+
+def interp_bands(kaxis, energies, kgrid):
+    #全bandを1回でkgridに線形内挿する, return: (nbands, len(kgrid))
+    kaxis = np.asarray(kaxis, dtype=np.float64)
+    i = np.clip(np.searchsorted(kaxis, kgrid, 'right'), 1, len(kaxis)-1)
+    dk = kaxis[i] - kaxis[i-1]
+    w = np.divide(kgrid - kaxis[i-1], dk, out=np.zeros(len(kgrid)), where=dk > 0)
+    w = np.clip(w, 0.0, 1.0)
+    return energies[:, i-1] * (1-w) + energies[:, i] * w
+
+def nearest_levels(ref, query):
+    #各k点でqueryの値に最も近いrefの値, ref(nr, nk), query(nq, nk) -> (nq, nk)
+    #k点ごとにsortしたrefをk番号*spanだけずらして1列に並べ, 1回のsearchsortedで全k点を探す
+    nr, nk = ref.shape
+    srt = np.sort(ref, axis=0).T
+    span = max(srt.max(), query.max()) - min(srt.min(), query.min()) + 1.0
+    offset = np.arange(nk)[:, None] * span
+    flat = srt.ravel()
+    idx = np.searchsorted((srt + offset).ravel(), (query.T + offset).ravel()).reshape(nk, -1)
+    base = np.arange(nk)[:, None] * nr
+    below = flat[np.clip(idx-1, base, base+nr-1)]
+    above = flat[np.clip(idx, base, base+nr-1)]
+    q = query.T
+    return np.where(np.abs(q - below) <= np.abs(above - q), below, above).T
+
+def band_deviation(qb, wb, window=(-2.0, 2.0)):
+    #return: dict, per-bandとoverallのrms, max(eV), 窓に入った点の数
+    lo, hi = -abs(window[0]), abs(window[1])
+    kgrid = np.asarray(wb.kaxis, dtype=np.float64)
+    qk = map_kaxis(qb.kaxis, qb.kpoints[1], wb.kpoints[1])
+    qe = interp_bands(qk, np.asarray(qb.energies), kgrid)
+    we = np.asarray(wb.energies, dtype=np.float64)
+    dev = we - nearest_levels(qe, we)
+    inwin = (we >= lo) & (we <= hi)
+
+    npts = inwin.sum(axis=1)
+    sq = np.where(inwin, dev**2, 0.0).sum(axis=1)
+    absdev = np.where(inwin, np.abs(dev), -np.inf)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rms = np.where(npts > 0, np.sqrt(sq / np.maximum(npts, 1)), np.nan)
+    bmax = np.where(npts > 0, absdev.max(axis=1), np.nan)
+    total = int(npts.sum())
+    overall = { 'npts': total, 'rms': float(np.sqrt(sq.sum()/total)) if total else float('nan'), \
+                'max': float(absdev.max()) if total else float('nan'), 'band': None, 'k': None }
+    if total:
+        n, k = np.unravel_index(np.argmax(absdev), absdev.shape)
+        overall['band'], overall['k'] = int(n)+1, float(kgrid[k])
+    return { 'window': [lo, hi], 'nk': len(kgrid), 'nbands_qe': len(qe), 'nbands_wb': len(we), \
+             'band': { 'npts': npts, 'rms': rms, 'max': bmax }, 'overall': overall }
+
+def format_deviation(result):
+    lines = ["window {:+.2f} ~ {:+.2f} eV, nk {}, QE {} bands, Wannier {} bands".format( \
+             *result['window'], result['nk'], result['nbands_qe'], result['nbands_wb'])]
+    lines.append("{:>6}  {:>6}  {:>10}  {:>10}".format("band", "npts", "rms[meV]", "max[meV]"))
+    band = result['band']
+    for n in range(result['nbands_wb']):
+        if band['npts'][n] == 0: continue
+        lines.append("{:6d}  {:6d}  {:10.2f}  {:10.2f}".format( \
+                     n+1, band['npts'][n], band['rms'][n]*1e3, band['max'][n]*1e3))
+    ov = result['overall']
+    lines.append("{:>6}  {:6d}  {:10.2f}  {:10.2f}".format("all", ov['npts'], ov['rms']*1e3, ov['max']*1e3))
+    if ov['band'] is not None:
+        lines.append("max at band {}, k = {:.4f}".format(ov['band'], ov['k']))
+    return "\n".join(lines)
+
+def deviation_json(result):
+    #nanはnullにする
+    to_list = lambda x: [ None if np.isnan(v) else float(v) for v in x ]
+    out = dict(result)
+    out['band'] = { 'npts': [ int(v) for v in result['band']['npts'] ], \
+                    'rms': to_list(result['band']['rms']), 'max': to_list(result['band']['max']) }
+    out['overall'] = { k: (None if isinstance(v, float) and np.isnan(v) else v) \
+                       for k, v in result['overall'].items() }
+    return out
+
+
+######################
+class compareoption():
+    def __init__(self, args=None):
+        #args: docoptと同じkeyのdict, Noneならcommand lineから読む
+        if args is None: args = docopt(__doc__)
+        self.window = [ float(x) for x in args['-w'].split('-') ]
+        if args['--no-cache']: cache.enabled = False
+        profile_setup(args)
+        self.json = args['--json']
+
+        dirlist = [ args['<dir>'] ]
+        if args['-d'] is not None:
+            dirlist = dirlist + args['-d']
+        with stage('discovery'):
+            files = Manifest(dirlist)
+        self.file_scf_out = files.get('scf_out')
+        self.file_nscf_in = files.get('nscf_in')
+        self.file_band_out = files.get('band_out')
+        self.file_band_gnu = files.get('band_gnu')
+        self.file_band_dat = files.get('band_dat')
+        self.file_labelinfo = files.get('labelinfo')
+
+        self.SAVE_PATH = args['-s'].rstrip('/') or '.'
+        if args['-p'] != "" : self.Prefix = args['-p']
+        else :
+            self.Prefix = os.path.basename(self.file_scf_out).replace(".scf.out", "")
+
+        with stage('scf_out'):
+            self.totE, self.ef, self.totM, self.absM = rd.read_scf_out(self.file_scf_out)
+
+def deviation_report(args=None):
+    #表を出力し(--jsonならfileにも書き), band_deviationの結果を返す, qb-batchからも呼ぶ
+    op = compareoption(args)
+    qb = QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu)
+    wb = WannierBand(op.ef, op.file_labelinfo, op.file_band_dat)
+    with stage('compare'):
+        result = band_deviation(qb, wb, op.window)
+    print(format_deviation(result))
+    if op.json:
+        file_json = "{}/{}_qb-wb.json".format(op.SAVE_PATH, op.Prefix)
+        with open(file_json, 'w') as f_json:
+            json.dump(deviation_json(result), f_json, indent=1)
+        print("-> {}".format(file_json))
+    return result
+
+def metricreport():
+    ## qb-wb:: qebandとWannierbandの差を数値で出力, 描画はしない
+    #console_scriptsは戻り値をsys.exitに渡すので何も返さない
+    deviation_report()
+
+if __name__=='__main__': metricreport()
@@ -1,7 +1,7 @@
 
 """
 Usage:
-  banddos_plot.py <dir> [-d <dir2>...] [-c <bdcolor>] [-e <EneScale>] [-o <Ecenter>]
+  banddos_plot.py <dir> [-d <dir2>...] [-c <bdcolor>] [-e <EneScale>] [-o <Ecenter>] [--lod-tol <eV>] [--no-lod] [--no-cache] [--float32] [--pdos-by <by>] [--out <file>] [--dpi <dpi>] [--rasterize <dpi>] [--watch <sec>] [--profile] [--profile-json <file>]
 
 Options:
   scf              scf.outの情報を表で出力する
@@ -10,105 +10,36 @@ Options:
   -c <bdcolor>     bandのcolor, defaultは5本ごとに色が変化  [default: rainbow]
   -e <EneScale>    任意のEneScale, 1-3-3のように指定, 指定すると1ページ目に新たにページを追加し、1つのグラフをplot    [default: 1-4-4]
   -o <Ecenter>     Eのグラフの中心, efから何eV離れたところに線を引くか  [default: 0.0]
+  --lod-tol <eV>   k点を間引くときに許す誤差(eV)  [default: 0.002]
+  --no-lod         k点を間引かずに全て描く
+  --no-cache       parse結果のcacheを使わない
+  --float32        bandのEをfloat32で持つ(memoryが半分になる)
+  --pdos-by <by>   pdos_atmを元素ごと(element)か元素と軌道ごと(orbital)に足してdosに重ねる
+  --out <file>     画面に出さずfileに保存する, 拡張子(png, svg, pdf)で形式を決める
+  --dpi <dpi>      pngで保存するときのdpi  [default: 200]
+  --rasterize <dpi>  band線だけをこのdpiのbitmapにする, 軸と文字はvectorのまま
+  --watch <sec>    計算中のband fileとscf.outをsec秒ごとに見て, 追記された分だけ読んで描き直す
+                   (--outならそのfileを書き直す), Ctrl-Cか図を閉じると終了
+  --profile        stageごとの時間とmemoryを表で出力する(QEPLOT_PROFILE=1でも可)
+  --profile-json <file>  stageごとの時間とmemoryをjsonに書き出す
 """
 
 from docopt import docopt
 import os
 import glob
+import time
 import numpy as np
-from matplotlib import pyplot as plt
-from matplotlib import axes as a
-from matplotlib.backends.backend_pdf import PdfPages
-
-import plottool as pt
-pt.mpl_init()
-
-########################
-# ===== ReadData ===== #
-########################
-
-class QeBand:
-    def __init__(self, ef, file_nscf_in, file_band_out, file_band_gnu):
-        self.ef = float(ef)
-        self.kpoints = [ self.read_nscf_in(file_nscf_in), self.read_band_out(file_band_out) ]
-        self.values = self.read_band_gnu(file_band_gnu)
-
-    def read_nscf_in(self, file_nscf_in):
-        kpoints_name = []
-        with open(file_nscf_in, 'r') as f_nscf_in:
-            lines = f_nscf_in.readlines()
-        for i, line in enumerate(lines):
-            if "K_POINTS" in line:
-                for j in (range(int(lines[i+1]))):
-                    if '!' in lines[i+j+2]:
-                        kpoints_name.append(lines[i+j+2].split('!')[-1])
-                break
-        kpoints_name = [ kn.replace("G", "$\Gamma$") for kn in kpoints_name ]
-        return kpoints_name
-
-    def read_band_out(self, file_band_out):
-        kpoints_coord = []
-        with open(file_band_out, "r") as f_band_out:
-            for line in f_band_out.readlines():
-                if "high-symmetry point" in line:
-                    kpoints_coord.append(float(line.split()[-1]))
-        return kpoints_coord
-
-    def read_band_gnu(self, file_band_gnu):
-        with open(file_band_gnu, 'r') as f_band_gnu:
-            lines = [ line.split() for line in f_band_gnu.readlines() ]
-        j, values = 0, []
-        for i, line in enumerate(lines):
-            if ( len(line) < 2 ):
-                value = np.array(lines[j:i], dtype=np.float64).T
-                value[1] = value[1] - self.ef
-                values.append(value)
-                j = i+1
-        return values
-
-class WannierBand:
-    def __init__(self, ef: float, file_labelinfo, file_band_dat):
-        self.ef = ef
-        self.kpoints = self.read_labelinfo(file_labelinfo)
-        self.values = self.read_band_dat(file_band_dat)
-
-    def read_labelinfo(self, file_labelinfo):
-        kpoints_name = []
-        kpoints_coord = []
-        with open(file_labelinfo, 'r')  as f_labelinfo:
-            for line in f_labelinfo.readlines():
-                kpoints_name.append(line.split()[0])
-                kpoints_coord.append(float(line.split()[2]))
-        kpoints_name = [ kn.replace("G", "$\Gamma$") for kn in kpoints_name ]
-        return [ kpoints_name, kpoints_coord ]
-
-    def read_band_dat(self, file_band_dat):
-        with open(file_band_dat, "r") as f_band_dat:
-            lines = [ line.split() for line in f_band_dat.readlines() ]
-        j, values = 0, []
-        for i, line in enumerate(lines):
-            if ( len(line) < 1 ):
-                value = np.array(lines[j:i], dtype=np.float64).T
-                value[1] = value[1] - self.ef
-                values.append(value)
-                j = i+1
-        return values
-
-class Dos:
-    def __init__(self, ef: float, column_pdos):
-        #column_pdos: ([ file名1, enecolumn1, doscolumn1 ],[file名2, .....)
-        self.ef = ef
-        self.values = []
-        for column in column_pdos:
-            self.values.append(self.read_pdos(column[0], column[1], column[2]))
-
-    def read_pdos(self, file_pdos, enecolumn, doscolumn):
-        with open(file_pdos, 'r') as f_pdos:
-            lines = [ line.split()  for line in f_pdos.readlines() ]
-        enevalue = [ float(line[enecolumn]) - self.ef for line in lines[1:] ]
-        dosvalue = [ float(line[doscolumn]) for line in lines[1:] ]
-        return [ enevalue, dosvalue ]
 
+import qEplot.readdata as rd
+from qEplot.lazy import plt
+from qEplot.readdata import QeBand, WannierBand, Dos
+from qEplot.tail import BandTail, ScfTail
+import qEplot.cache as cache
+from qEplot.profiler import stage, setup as profile_setup
+from qEplot.discovery import Manifest
+from qEplot.bandcompare import map_kaxis
+from qEplot.bandlines import MakeAxesTable, DosPlot, BandLinePlot, BandLineComparePlot, BandLineUpdate, DosGroupPlot
+from qEplot.pagerender import headless, output_format, save_figure
 
 ######################
 class plotoption():
@@ -118,87 +49,194 @@ class plotoption():
         self.bdcolor = args['-c']
         self.optEneScale = [ float(x) for x in args['-e'].split('-') ]
         self.Ecenter = float(args['-o'])
+        self.lod_tol = None if args['--no-lod'] else float(args['--lod-tol'])
+        if args['--no-cache']: cache.enabled = False
+        self.dtype = np.float32 if args.get('--float32') else np.float64
+        profile_setup(args)
+        self.pdos_by = args['--pdos-by']
+        self.file_out = args['--out']
+        self.dpi = float(args['--dpi'])
+        self.rasterize = None if args['--rasterize'] is None else float(args['--rasterize'])
+        self.watch = None if args['--watch'] is None else float(args['--watch'])
+        if self.file_out is not None:
+            output_format(self.file_out)
+            headless()
 
         dirlist = [ args['<dir>'] ]
         if args['-d'] is not None:
             dirlist = dirlist + args['-d']
-        files = []
-        self.w90 = False
-        for dir in dirlist: files = files + pt.filelist(dir)
-        for file in files:
-            if   ".scf.out" in file: self.file_scf_out=file
-            elif ".nscf.in" in file:
-                with open(file, 'r') as fl:
-                    if "\'bands\'" in fl.read():self.file_nscf_in=file
-            elif ".band.out" in file: self.file_band_out=file
-            elif ".band.gnu" in file: self.file_band_gnu=file
-            elif "_band.dat" in file: self.file_band_dat=file
-            elif ".labelinfo.dat" in file:
-                self.file_labelinfo=file
-                self.w90 = True
-            elif ".pdos_tot" in file: self.file_pdos_tot=file
-
-        self.totE, self.ef, self.totM, self.absM = pt.read_scf_out(self.file_scf_out)
-
+        self.dirlist = dirlist
+        with stage('discovery'):
+            files = Manifest(dirlist)
+        self.file_scf_out = files.get('scf_out')
+        self.file_nscf_in = files.get('nscf_in')
+        self.file_band_out = files.get('band_out')
+        self.file_band_gnu = files.get('band_gnu')
+        self.file_band_dat = files.get('band_dat')
+        self.file_labelinfo = files.get('labelinfo')
+        self.file_pdos_tot = files.get('pdos_tot')
+        self.file_pdos_atm = files.all('pdos_atm')
+        self.w90 = self.file_labelinfo is not None
+
+        with stage('scf_out'):
+            self.totE, self.ef, self.totM, self.absM = rd.read_scf_out(self.file_scf_out)
+
+
+####### Watch #######
+#--watch: band fileは最初から, scf.outは読んだ後ろから, 追記された分だけを読む
+#高対称点のfile(nscf.in, band.out, labelinfo)は小さいのでbandが増えたときに読み直す
+#bands.xより先に起動してband fileがまだ無いときは, pollのたびにdirを探し直す
+
+class BandWatch:
+    def __init__(self, op, w90):
+        self.op = op
+        self.w90 = w90
+        self.band = BandTail(op.file_band_dat if w90 else op.file_band_gnu)
+
+    def poll(self):
+        with stage('band tail'):
+            if self.band.tail.file is None: self.discover()
+            return self.band.poll()
+
+    def discover(self):
+        files = Manifest(self.op.dirlist)
+        for kind in ('nscf_in', 'band_out', 'band_gnu', 'band_dat'):
+            if getattr(self.op, 'file_' + kind) is None:
+                setattr(self.op, 'file_' + kind, files.get(kind))
+        file = self.op.file_band_dat if self.w90 else self.op.file_band_gnu
+        if file is not None: self.band = BandTail(file)
+
+    def kpoints(self):
+        if self.w90: return rd.read_labelinfo(self.op.file_labelinfo)
+        if self.op.file_nscf_in is None or self.op.file_band_out is None: return [ (), () ]
+        return [ rd.read_nscf_in(self.op.file_nscf_in), rd.read_band_out(self.op.file_band_out) ]
+
+    def bands(self):
+        kaxis, energies, extra = self.band.table()
+        labels, ticks = self.kpoints()
+        return rd.BandStructure(kaxis, energies - self.op.ef, extra, labels, ticks, \
+                                self.op.ef, self.op.dtype)
+
+def load_band(op, w90):
+    #return: BandStructure, BandWatch(--watchのときだけ)
+    if op.watch is not None:
+        #scfが終わるまでFermi energyは出ないので0とし, 出たら描き直す
+        if op.ef == "": op.ef = 0.0
+        watch = BandWatch(op, w90)
+        watch.poll()
+        return watch.bands(), watch
+    if w90: return WannierBand(op.ef, op.file_labelinfo, op.file_band_dat, op.dtype), None
+    return QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu, op.dtype), None
+
+def watch_loop(fig, op, watches, update):
+    #op.watch秒ごとにpollし, bandが増えたかefが変わったらupdate(BandStructure, ...)で線を差し替える
+    scf = ScfTail(op.file_scf_out, from_end=True, values=(op.totE, op.ef, op.totM, op.absM))
+    if op.file_out is None: plt.show(block=False)
+    else: show_or_save(fig, op)
+    try:
+        while True:
+            if op.file_out is None:
+                if not plt.fignum_exists(fig.number): return
+                plt.pause(op.watch)
+            else:
+                time.sleep(op.watch)
+            changed = any([ w.poll() for w in watches ])
+            with stage('scf tail'):
+                if scf.poll():
+                    totE, ef, op.totM, op.absM = scf.values()
+                    if ef != "" and ef != op.ef: op.ef, changed = ef, True
+            if not changed: continue
+            with stage('update'):
+                update(*[ w.bands() for w in watches ])
+            if op.file_out is None:
+                fig.canvas.draw_idle()
+                continue
+            with stage('savefig'):
+                save_figure(fig, op.file_out, op.dpi, op.rasterize)
+            print("{}  {} bands -> {}".format(time.strftime('%H:%M:%S'), \
+                  ", ".join( str(w.band.nband) for w in watches ), op.file_out))
+    except KeyboardInterrupt:
+        pass
 
 ####### Main #######
 
+def show_or_save(fig, op):
+    #--outがなければ画面に出す
+    if op.file_out is None:
+        with stage('show'):
+            plt.show()
+        return
+    with stage('savefig'):
+        save_figure(fig, op.file_out, op.dpi, op.rasterize)
+    print(op.file_out)
+
 def bandplot():
     op = plotoption()
-    if op.w90 == False :
-        bd = QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu)
-    else :
-        bd = WannierBand(op.ef, op.file_labelinfo, op.file_band_dat)
-    fig, ax = pt.MakeAxesTable([1], [1.3], width=18, height=20, margin=1.8)
-    pt.BandSinglePlot(ax[0][0], bd.values, bd.kpoints, op.optEneScale, \
+    bd, watch = load_band(op, op.w90)
+    fig, ax = MakeAxesTable([1], [1.3], width=18, height=20, margin=1.8)
+    lc = BandLinePlot(ax[0][0], bd, op.optEneScale, \
                       Ecenter=op.Ecenter, bdcolor=op.bdcolor, \
-                      detailgrid=True, MinorScale=op.optEneScale[0]/5)
+                      detailgrid=True, MinorScale=op.optEneScale[0]/5, lod_tol=op.lod_tol, \
+                      rasterized=op.rasterize is not None)
     ax[0][0].tick_params('x', labelsize=18)
     ax[0][0].tick_params('y', labelsize=16)
     ax[0][0].yaxis.label.set_size(22)
-    plt.show()
+    if watch is not None:
+        watch_loop(fig, op, [watch], lambda bd: BandLineUpdate(ax[0][0], lc, bd, op.bdcolor, op.lod_tol))
+        return
+    show_or_save(fig, op)
 
 ##--- qb-p:: bandとdosの比較を出力 ---##
 ##--- wb-p:: Wannierのbandとdosの比較を出力 ---##
 def banddosplot():
     op = plotoption()
-    if op.w90 == False :
-        bd = QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu)
-    else :
-        bd = WannierBand(op.ef, op.file_labelinfo, op.file_band_dat)
-    ds = Dos(ef, [[op.file_pdos_tot, 0, 2], [op.file_pdos_tot, 0, 1]])
-
-    fig, ax = pt.MakeAxesTable([1,0.7], [1.3], width=30, height=20, margin=1.8)
-    pt.BandSinglePlot(ax[0][0], bd.values, bd.kpoints, op.optEneScale, \
+    bd, watch = load_band(op, op.w90)
+    ds = Dos(op.ef, [[op.file_pdos_tot, 0, 2], [op.file_pdos_tot, 0, 1]], \
+             op.file_pdos_atm, op.pdos_by)
+
+    fig, ax = MakeAxesTable([1,0.7], [1.3], width=30, height=20, margin=1.8)
+    lc = BandLinePlot(ax[0][0], bd, op.optEneScale, \
                       Ecenter=op.Ecenter, bdcolor=op.bdcolor, \
-                      detailgrid=True, MinorScale=elf.ptEneScale[0]/5)
-    pt.DosPlot(ax[0][1], ds.values, op.optEneScale, Ecenter=op.Ecenter, \
+                      detailgrid=True, MinorScale=op.optEneScale[0]/5, lod_tol=op.lod_tol, \
+                      rasterized=op.rasterize is not None)
+    DosPlot(ax[0][1], ds.values, op.optEneScale, Ecenter=op.Ecenter, \
                detailgrid=True, MinorScale=op.optEneScale[0]/5)
+    DosGroupPlot(ax[0][1], ds)
     ax[0][0].tick_params('x', labelsize=18)
     ax[0][0].tick_params('y', labelsize=16)
     ax[0][1].tick_params('x', labelsize=16)
     ax[0][1].tick_params('y', labelsize=16)
     ax[0][0].yaxis.label.set_size(22)
     ax[0][1].set_ylabel("")
-    plt.show()
+    if watch is not None:
+        #dosは計算が終わってから出るので描き直さない
+        watch_loop(fig, op, [watch], lambda bd: BandLineUpdate(ax[0][0], lc, bd, op.bdcolor, op.lod_tol))
+        return
+    show_or_save(fig, op)
 
 ## qb-wb:: qebandとWannierbandの比較を6つの範囲で出力
 def qbwbplot():
     op = plotoption()
-    qb = QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu)
-    wb = WannierBand(op.ef, op.file_labelinfo, op.file_band_dat)
-    qb_values=[]
-    for value in qb.values:
-        adjust_qb_xvalue=pt.AdjustXvalue(value[0], qb.kpoints[1][-1], wb.kpoints[1][-1])
-        qb_values.append([adjust_qb_xvalue, value[1]])
-
-    fig, ax = pt.MakeAxesTable([1], [1.3], width=18, height=20, margin=1.8)
-    pt.BandComparePlot(ax[0][0], qb_values, wb.values, wb.kpoints, \
+    qb, qb_watch = load_band(op, False)
+    wb, wb_watch = load_band(op, True)
+    #qeのk軸をwannierの高対称点に合わせる(全bandで1回)
+    adjust = lambda qb, wb: qb.with_kaxis(map_kaxis(qb.kaxis, qb.kpoints[1], wb.kpoints[1]))
+    qb = adjust(qb, wb)
+
+    fig, ax = MakeAxesTable([1], [1.3], width=18, height=20, margin=1.8)
+    lc_qb, lc_wb = BandLineComparePlot(ax[0][0], qb, wb, \
                        op.optEneScale, Ecenter=op.Ecenter, \
-                       detailgrid=True, MinorScale=op.optEneScale[0]/5)
+                       detailgrid=True, MinorScale=op.optEneScale[0]/5, lod_tol=op.lod_tol, \
+                       rasterized=op.rasterize is not None)
     ax[0][0].tick_params('x', labelsize=18)
     ax[0][0].tick_params('y', labelsize=16)
     ax[0][0].yaxis.label.set_size(22)
-    plt.show()
+    if op.watch is not None:
+        def update(qb, wb):
+            BandLineUpdate(ax[0][0], lc_qb, adjust(qb, wb), 'black', op.lod_tol, wb.kpoints[1])
+            BandLineUpdate(ax[0][0], lc_wb, wb, 'red', op.lod_tol)
+        watch_loop(fig, op, [qb_watch, wb_watch], update)
+        return
+    show_or_save(fig, op)
 
 
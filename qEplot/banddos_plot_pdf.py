@@ -1,7 +1,7 @@
 
 """
 Usage:
-  banddos_plot_pdf.py <dir> [-d <dir2>...] [-p <Prefix>] [-s <SAVE_PATH>] [-c <bdcolor>] [-e <EneScale>] [-o <Ecenter>]
+  banddos_plot_pdf.py <dir> [-d <dir2>...] [-p <Prefix>] [-s <SAVE_PATH>] [-c <bdcolor>] [-e <EneScale>] [-o <Ecenter>] [-j <nproc>] [--lod-tol <eV>] [--no-lod] [--no-cache] [--float32] [--pdos-by <by>] [-f <format>] [--dpi <dpi>] [--rasterize <dpi>] [--profile] [--profile-json <file>]
 
 Options:
   scf              scf.outの情報を表で出力する
@@ -12,135 +12,70 @@ Options:
   -c <bdcolor>     bandのcolor, defaultは5本ごとに色が変化  [default: rainbow]
   -e <EneScale>    任意のEneScale, 1-3-3のように指定, 指定すると1ページ目に新たにページを追加し、1つのグラフをplot    [default: 1-4-4]
   -o <Ecenter>     Eのグラフの中心, efから何eV離れたところに線を引くか  [default: 0.0]
+  -j <nproc>       pageを並列に描画するprocess数, 0ならcpu数  [default: 0]
+  --lod-tol <eV>   k点を間引くときに許す誤差(eV)  [default: 0.002]
+  --no-lod         k点を間引かずに全て描く
+  --no-cache       parse結果のcacheを使わない
+  --float32        bandのEをfloat32で持つ(memoryが半分になる)
+  --pdos-by <by>   pdos_atmを元素ごと(element)か元素と軌道ごと(orbital)に足してdosに重ねる
+  -f <format>      出力形式, pdf, png, svg. png, svgはpageごとに別fileになる  [default: pdf]
+  --dpi <dpi>      pngで保存するときのdpi  [default: 200]
+  --rasterize <dpi>  band線だけをこのdpiのbitmapにする, 軸と文字はvectorのまま
+  --profile        stageごとの時間とmemoryを表で出力する(QEPLOT_PROFILE=1でも可)
+  --profile-json <file>  stageごとの時間とmemoryをjsonに書き出す
 """
 
 from docopt import docopt
 import os
 import glob
 import numpy as np
-from matplotlib import pyplot as plt
-from matplotlib import axes as a
-from matplotlib.backends.backend_pdf import PdfPages
-
-import plottool as pt
-pt.mpl_init()
-
-########################
-# ===== ReadData ===== #
-########################
-
-class QeBand:
-    def __init__(self, ef, file_nscf_in, file_band_out, file_band_gnu):
-        self.ef = float(ef)
-        self.kpoints = [ self.read_nscf_in(file_nscf_in), self.read_band_out(file_band_out) ]
-        self.values = self.read_band_gnu(file_band_gnu)
-
-    def read_nscf_in(self, file_nscf_in):
-        kpoints_name = []
-        with open(file_nscf_in, 'r') as f_nscf_in:
-            lines = f_nscf_in.readlines()
-        for i, line in enumerate(lines):
-            if "K_POINTS" in line:
-                for j in (range(int(lines[i+1]))):
-                    if '!' in lines[i+j+2]:
-                        kpoints_name.append(lines[i+j+2].split('!')[-1])
-                break
-        kpoints_name = [ kn.replace("G", "$\Gamma$") for kn in kpoints_name ]
-        return kpoints_name
-
-    def read_band_out(self, file_band_out):
-        kpoints_coord = []
-        with open(file_band_out, "r") as f_band_out:
-            for line in f_band_out.readlines():
-                if "high-symmetry point" in line:
-                    kpoints_coord.append(float(line.split()[-1]))
-        return kpoints_coord
-
-    def read_band_gnu(self, file_band_gnu):
-        values = [[[],[]]]
-        with open(file_band_gnu, 'r') as f_band_gnu:
-            lines = [ line.split() for line in f_band_gnu.readlines() ]
-        j = k = 0
-        for i, line in enumerate(lines):
-            if ( len(line) < 2 ):
-                values[k][0] = [ float(lines[n][0]) for n in range(j,i) ]
-                values[k][1] = [ float(lines[n][1])-self.ef for n in range(j,i) ]
-                values.extend([[[],[]]])
-                j = i+1
-                k += 1
-        return values
-
-class WannierBand:
-    def __init__(self, ef: float, file_labelinfo, file_band_dat):
-        self.ef = ef
-        self.kpoints = self.read_labelinfo(file_labelinfo)
-        self.values = self.read_band_dat(file_band_dat)
-
-    def read_labelinfo(self, file_labelinfo):
-        kpoints_name = []
-        kpoints_coord = []
-        with open(file_labelinfo, 'r')  as f_labelinfo:
-            for line in f_labelinfo.readlines():
-                kpoints_name.append(line.split()[0])
-                kpoints_coord.append(float(line.split()[2]))
-        kpoints_name = [ kn.replace("G", "$\Gamma$") for kn in kpoints_name ]
-        return [ kpoints_name, kpoints_coord ]
-
-    def read_band_dat(self, file_band_dat):
-        values = [[[],[]]]
-        lines = [ line.split()  for line in open(file_band_dat, "r").readlines() ]
-        j = k = 0
-        for i, line in enumerate(lines):
-            if ( len(line) < 1 ):
-                values[k][0] = [ float(lines[n][0]) for n in range(j,i) ]
-                values[k][1] = [ float(lines[n][1]) -self.ef for n in range(j,i) ]
-                values.extend([[[],[]]])
-                j = i+1
-                k += 1
-        return values
-
-class Dos:
-    def __init__(self, ef: float, column_pdos):
-        #column_pdos: ([ file名1, enecolumn1, doscolumn1 ],[file名2, .....)
-        self.ef = ef
-        self.values = []
-        for column in column_pdos:
-            self.values.append(self.read_pdos(column[0], column[1], column[2]))
-
-    def read_pdos(self, file_pdos, enecolumn, doscolumn):
-        with open(file_pdos, 'r') as f_pdos:
-            lines = [ line.split()  for line in f_pdos.readlines() ]
-        enevalue = [ float(line[enecolumn]) - self.ef for line in lines[1:] ]
-        dosvalue = [ float(line[doscolumn]) for line in lines[1:] ]
-        return [ enevalue, dosvalue ]
 
+import qEplot.readdata as rd
+from qEplot.lazy import pt, plt
+from qEplot.readdata import QeBand, WannierBand, Dos
+import qEplot.cache as cache
+from qEplot.profiler import stage, setup as profile_setup
+from qEplot.discovery import Manifest
+from qEplot.bandcompare import map_kaxis
+from qEplot.bandlines import MakeAxesTable, DosPlot, BandLinePlot, BandLineComparePlot, DosGroupPlot
+from qEplot.pagerender import headless, render_pages, formats
 
 ######################
 class plotoption():
-    def __init__(self):
+    def __init__(self, args=None):
         #----- 引数処理 -----#
-        args = docopt(__doc__)
+        #args: docoptと同じkeyのdict, Noneならcommand lineから読む
+        if args is None: args = docopt(__doc__)
         self.bdcolor = args['-c']
         self.optEneScale = [ float(x) for x in args['-e'].split('-') ]
         self.Ecenter = float(args['-o'])
+        self.nproc = int(args['-j']) or None
+        self.lod_tol = None if args['--no-lod'] else float(args['--lod-tol'])
+        if args['--no-cache']: cache.enabled = False
+        self.dtype = np.float32 if args.get('--float32') else np.float64
+        profile_setup(args)
+        self.pdos_by = args['--pdos-by']
+        self.fmt = args['-f']
+        if self.fmt not in formats:
+            raise ValueError("output format must be one of {}: {}".format(", ".join(formats), self.fmt))
+        self.dpi = float(args['--dpi'])
+        self.rasterize = None if args['--rasterize'] is None else float(args['--rasterize'])
+        headless()
 
         dirlist = [ args['<dir>'] ]
         if args['-d'] is not None:
             dirlist = dirlist + args['-d']
-        files = []
-        for dir in dirlist: files = files + pt.filelist(dir)
-        for file in files:
-            if   ".scf.out" in file: self.file_scf_out=file
-            elif ".nscf.in" in file:
-                with open(file, 'r') as fl:
-                    if "\'bands\'" in fl.read():self.file_nscf_in=file
-            elif ".band.out" in file: self.file_band_out=file
-            elif ".band.gnu" in file: self.file_band_gnu=file
-            elif "_band.dat" in file: self.file_band_dat=file
-            elif ".labelinfo.dat" in file:
-                self.file_labelinfo=file
-                self.w90 = True
-            elif ".pdos_tot" in file: self.file_pdos_tot=file
+        with stage('discovery'):
+            files = Manifest(dirlist)
+        self.file_scf_out = files.get('scf_out')
+        self.file_nscf_in = files.get('nscf_in')
+        self.file_band_out = files.get('band_out')
+        self.file_band_gnu = files.get('band_gnu')
+        self.file_band_dat = files.get('band_dat')
+        self.file_labelinfo = files.get('labelinfo')
+        self.file_pdos_tot = files.get('pdos_tot')
+        self.file_pdos_atm = files.all('pdos_atm')
+        self.w90 = self.file_labelinfo is not None
 
         self.SAVE_PATH = args['-s']
         if self.SAVE_PATH[-1] == '/': self.SAVE_PATH = self.SAVE_PATH[:-1]
@@ -149,182 +84,190 @@ class plotoption():
             for dir in dirlist: self.Prefix = self.file_scf_out.replace(dir, "")
             self.Prefix=self.Prefix.replace(".scf.out", "").replace("/", "")
 
-        self.totE, self.ef, self.totM, self.absM = pt.read_scf_out(self.file_scf_out)
+        with stage('scf_out'):
+            self.totE, self.ef, self.totM, self.absM = rd.read_scf_out(self.file_scf_out)
 
 
 ####### Main #######
 
-def bandplot():
-    op = plotoption()
-    if op.w90 == False :
-        bd = QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu)
-        pp = PdfPages("{}/{}_qb.pdf".format(op.SAVE_PATH, op.Prefix))
-        Title = "{}\nQeBand".format(op.Prefix)
-    else :
-        bd = WannierBand(op.ef, op.file_labelinfo, op.file_band_dat)
-        pp = PdfPages("{}/{}_wb.pdf".format(op.SAVE_PATH, op.Prefix))
-        Title = "{}\nWannierBand".format(op.Prefix)
-
-    #---page0---#
-    if len(op.optEneScale) == 3:
-        fig, ax = pt.MakeAxesTable(pt.bd_single_width, pt.bd_single_height, \
-                                   margin=pt.bd_single_margin)
-        for i in range(len(ax)):
-            for j in range(len(ax[0])):
-                pt.BandSinglePlot(ax[i][j], bd.values, bd.kpoints,op.optEneScale, \
-                                  Ecenter=op.Ecenter, bdcolor=op.bdcolor)
-                ax[i][j].tick_params('x', labelsize=18)
-                ax[i][j].tick_params('y', labelsize=16)
-                ax[i][j].yaxis.label.set_size(22)
-        plt.savefig(pp, format='pdf')
-        fig.clf()
-
-    #---page1---#
-    fig, ax = pt.MakeAxesTable(pt.bd_table_width, pt.bd_table_height, \
+def bd_single_page(bd, op):
+    fig, ax = MakeAxesTable(pt.bd_single_width, pt.bd_single_height, \
+                               margin=pt.bd_single_margin)
+    for i in range(len(ax)):
+        for j in range(len(ax[0])):
+            BandLinePlot(ax[i][j], bd, op.optEneScale, \
+                              Ecenter=op.Ecenter, bdcolor=op.bdcolor, lod_tol=op.lod_tol, \
+                              rasterized=op.rasterize is not None)
+            ax[i][j].tick_params('x', labelsize=18)
+            ax[i][j].tick_params('y', labelsize=16)
+            ax[i][j].yaxis.label.set_size(22)
+    return fig
+
+def bd_table_page(bd, op, Title):
+    fig, ax = MakeAxesTable(pt.bd_table_width, pt.bd_table_height, \
                                margin=pt.bd_table_margin, Title=Title)
     EneScale = np.array(pt.bd_table_ESl).reshape(3,2,3).tolist()
     for i in range(len(ax)):
         for j in range(len(ax[0])):
-            pt.BandSinglePlot(ax[i][j], bd.values, bd.kpoints, EneScale[i][j], \
-                              Ecenter=op.Ecenter, bdcolor=op.bdcolor)
-    plt.savefig(pp, format='pdf')
-    fig.clf()
+            BandLinePlot(ax[i][j], bd, EneScale[i][j], \
+                              Ecenter=op.Ecenter, bdcolor=op.bdcolor, lod_tol=op.lod_tol, \
+                              rasterized=op.rasterize is not None)
+    return fig
 
-    #---page2---#
+def bd_detail_page(bd, op):
     # 詳細なgridの追加
-    fig, ax = pt.MakeAxesTable(pt.bd_detail_width, pt.bd_detail_height, \
+    fig, ax = MakeAxesTable(pt.bd_detail_width, pt.bd_detail_height, \
                                margin=pt.bd_detail_margin)
     for i in range(len(ax)):
         for j in range(len(ax[0])):
-            pt.BandSinglePlot(ax[i][j], bd.values, bd.kpoints, \
+            BandLinePlot(ax[i][j], bd, \
                               pt.bd_detail_ESl, Ecenter=op.Ecenter, \
-                              bdcolor=op.bdcolor, detailgrid=True)
-    plt.savefig(pp, format='pdf')
-    fig.clf()
-
-    pp.close()
-
+                              bdcolor=op.bdcolor, detailgrid=True, lod_tol=op.lod_tol, \
+                              rasterized=op.rasterize is not None)
+    return fig
 
-def banddosplot():
-    ##--- qb-p:: bandとdosの比較を6つの範囲で出力 ---##
-    ##--- wb-p:: Wannierのbandとdosの比較を6つの範囲で出力 ---##
-    op = plotoption()
+def bandplot(args=None):
+    op = plotoption(args)
     if op.w90 == False :
-        bd = QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu)
-        pp = PdfPages("{}/{}_qb-p.pdf".format(op.SAVE_PATH, op.Prefix))
-        Title = "{}\nQeBand-pdos".format(op.Prefix)
+        bd = QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu, op.dtype)
+        file_pdf = "{}/{}_qb.{}".format(op.SAVE_PATH, op.Prefix, op.fmt)
+        Title = "{}\nQeBand".format(op.Prefix)
     else :
-        bd = WannierBand(op.ef, op.file_labelinfo, op.file_band_dat)
-        pp = PdfPages("{}/{}_wb-p.pdf".format(op.SAVE_PATH, op.Prefix))
-        Title = "{}\nWannier-pdos".format(op.Prefix)
-    ds = Dos(op.ef, [[op.file_pdos_tot, 0, 2], [op.file_pdos_tot, 0, 1]])
+        bd = WannierBand(op.ef, op.file_labelinfo, op.file_band_dat, op.dtype)
+        file_pdf = "{}/{}_wb.{}".format(op.SAVE_PATH, op.Prefix, op.fmt)
+        Title = "{}\nWannierBand".format(op.Prefix)
 
-    #---page0---#
-    if len(op.optEneScale) == 3:
-        bdp_single_width = pt.bd_single_width.copy()
-        bdp_single_width.append(pt.bd_single_width[0]*6/10)
-        fig, ax = pt.MakeAxesTable(pt.bdp_single_width, pt.bd_single_height, \
-                                   margin=pt.bdp_single_margin, \
-                                   width = 25, height=13)
-        for i in range(len(ax)):
-            pt.BandSinglePlot(ax[i][0], bd.values, bd.kpoints, op.optEneScale, \
-                           Ecenter=op.Ecenter, bdcolor=op.bdcolor)
-            pt.DosPlot(ax[i][1], ds.values, op.optEneScale, Ecenter=op.Ecenter)
-            ax[i][0].tick_params('x', labelsize=18)
-            ax[i][0].tick_params('y', labelsize=16)
-            ax[i][1].tick_params('x', labelsize=16)
-            ax[i][1].tick_params('y', labelsize=16)
-            ax[i][0].yaxis.label.set_size(22)
-            ax[i][1].set_ylabel("")
-        plt.savefig(pp, format='pdf')
-        fig.clf()
+    pages = []
+    if len(op.optEneScale) == 3: pages.append((bd_single_page, (bd, op)))
+    pages.append((bd_table_page, (bd, op, Title)))
+    pages.append((bd_detail_page, (bd, op)))
+    with stage('render'):
+        render_pages(pages, file_pdf, op.nproc, op.dpi, op.rasterize)
 
-    #---page1,2---#
+
+def bdp_single_page(bd, ds, op):
+    bdp_single_width = pt.bd_single_width.copy()
+    bdp_single_width.append(pt.bd_single_width[0]*6/10)
+    fig, ax = MakeAxesTable(bdp_single_width, pt.bd_single_height, \
+                               margin=pt.bdp_single_margin, \
+                               width = 25, height=13)
+    for i in range(len(ax)):
+        BandLinePlot(ax[i][0], bd, op.optEneScale, \
+                       Ecenter=op.Ecenter, bdcolor=op.bdcolor, lod_tol=op.lod_tol, \
+                       rasterized=op.rasterize is not None)
+        DosPlot(ax[i][1], ds.values, op.optEneScale, Ecenter=op.Ecenter)
+        DosGroupPlot(ax[i][1], ds)
+        ax[i][0].tick_params('x', labelsize=18)
+        ax[i][0].tick_params('y', labelsize=16)
+        ax[i][1].tick_params('x', labelsize=16)
+        ax[i][1].tick_params('y', labelsize=16)
+        ax[i][0].yaxis.label.set_size(22)
+        ax[i][1].set_ylabel("")
+    return fig
+
+def bdp_table_page(bd, ds, op, page, Title):
     EneScale = np.array(pt.bd_table_ESl).reshape(2,3,3).tolist()
-    for page in range(2):
-        if page != 0 : Title = ""
-        fig, ax = pt.MakeAxesTable(pt.bdp_table_width, pt.bdp_table_height, \
-                                   margin=pt.bdp_table_margin, Title=Title, header=pt.header)
-        for i in range(len(ax)):
-            pt.BandSinglePlot(ax[i][0], bd.values, bd.kpoints, \
-                              EneScale[page][i], Ecenter=Ecenter, bdcolor=bdcolor)
-            pt.DosPlot(ax[i][1], ds.values, EneScale[page][i], Ecenter=Ecenter)
-            ax[i][1].set_ylabel("")
-        plt.savefig(pp, format='pdf')
-        fig.clf()
+    fig, ax = MakeAxesTable(pt.bdp_table_width, pt.bdp_table_height, \
+                               margin=pt.bdp_table_margin, Title=Title, header=pt.header)
+    for i in range(len(ax)):
+        BandLinePlot(ax[i][0], bd, \
+                          EneScale[page][i], Ecenter=op.Ecenter, bdcolor=op.bdcolor, lod_tol=op.lod_tol, \
+                          rasterized=op.rasterize is not None)
+        DosPlot(ax[i][1], ds.values, EneScale[page][i], Ecenter=op.Ecenter)
+        DosGroupPlot(ax[i][1], ds)
+        ax[i][1].set_ylabel("")
+    return fig
 
-    #---page3---#
+def bdp_detail_page(bd, ds, op):
     bdp_detail_width = pt.bd_detail_width.copy()
     bdp_detail_width.append(pt.bd_detail_width[0]*6/10)
-    fig, ax = pt.MakeAxesTable(bdp_detail_width, pt.bd_detail_height, \
+    fig, ax = MakeAxesTable(bdp_detail_width, pt.bd_detail_height, \
                                    margin=pt.bdp_detail_margin, width = 25)
     for i in range(len(ax)):
-        pt.BandSinglePlot(ax[i][0], bd.values, bd.kpoints, pt.bd_detail_ESl, \
-               Ecenter=Ecenter, bdcolor=bdcolor, detailgrid=True, MinorScale=0.2)
-        pt.DosPlot(ax[i][1], ds.values, pt.bd_detail_ESl, Ecenter=Ecenter, \
+        BandLinePlot(ax[i][0], bd, pt.bd_detail_ESl, \
+               Ecenter=op.Ecenter, bdcolor=op.bdcolor, detailgrid=True, MinorScale=0.2, lod_tol=op.lod_tol, \
+               rasterized=op.rasterize is not None)
+        DosPlot(ax[i][1], ds.values, pt.bd_detail_ESl, Ecenter=op.Ecenter, \
                    detailgrid=True)
+        DosGroupPlot(ax[i][1], ds)
         ax[i][1].set_ylabel("")
-    plt.savefig(pp, format='pdf')
-    fig.clf()
-
-    pp.close()
+    return fig
 
+def banddosplot(args=None):
+    ##--- qb-p:: bandとdosの比較を6つの範囲で出力 ---##
+    ##--- wb-p:: Wannierのbandとdosの比較を6つの範囲で出力 ---##
+    op = plotoption(args)
+    if op.w90 == False :
+        bd = QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu, op.dtype)
+        file_pdf = "{}/{}_qb-p.{}".format(op.SAVE_PATH, op.Prefix, op.fmt)
+        Title = "{}\nQeBand-pdos".format(op.Prefix)
+    else :
+        bd = WannierBand(op.ef, op.file_labelinfo, op.file_band_dat, op.dtype)
+        file_pdf = "{}/{}_wb-p.{}".format(op.SAVE_PATH, op.Prefix, op.fmt)
+        Title = "{}\nWannier-pdos".format(op.Prefix)
+    ds = Dos(op.ef, [[op.file_pdos_tot, 0, 2], [op.file_pdos_tot, 0, 1]], \
+             op.file_pdos_atm, op.pdos_by)
 
-def qbwbplot():
-    ## qb-wb:: qebandとWannierbandの比較を6つの範囲で出力
-    op = plotoption()
-    pp = PdfPages("{}/{}_qb-wb.pdf".format(op.SAVE_PATH, op.Prefix))
-    Title = "{}\nQe-WannierBand".format(op.Prefix)
-
-    qb = QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu)
-    wb = WannierBand(op.ef, op.file_labelinfo, op.file_band_dat)
-    qb_values=[]
-    for value in qb.values:
-        adjust_qb_xvalue=pt.AdjustXvalue(value[0], qb.kpoints[1][-1], wb.kpoints[1][-1])
-        qb_values.append([adjust_qb_xvalue, value[1]])
+    pages = []
+    if len(op.optEneScale) == 3: pages.append((bdp_single_page, (bd, ds, op)))
+    pages.append((bdp_table_page, (bd, ds, op, 0, Title)))
+    pages.append((bdp_table_page, (bd, ds, op, 1, "")))
+    pages.append((bdp_detail_page, (bd, ds, op)))
+    with stage('render'):
+        render_pages(pages, file_pdf, op.nproc, op.dpi, op.rasterize)
 
-    #---page0---#
-    if len(op.optEneScale) == 3:
-        fig, ax = pt.MakeAxesTable(pt.bd_single_width, pt.bd_single_height, \
-                                   margin=pt.bd_single_margin)
-        for i in range(len(ax)):
-            for j in range(len(ax[0])):
-                pt.BandComparePlot(ax[i][j], qb_values, wb.values, wb.kpoints, \
-                              op.optEneScale, Ecenter=op.Ecenter)
-                ax[i][j].tick_params('x', labelsize=18)
-                ax[i][j].tick_params('y', labelsize=16)
-                ax[i][j].yaxis.label.set_size(22)
-        plt.savefig(pp, format='pdf')
-        fig.clf()
 
-    #---page1---#
-    fig, ax = pt.MakeAxesTable(pt.bd_table_width, pt.bd_table_height, \
+def qbwb_single_page(qb, wb, op):
+    fig, ax = MakeAxesTable(pt.bd_single_width, pt.bd_single_height, \
+                               margin=pt.bd_single_margin)
+    for i in range(len(ax)):
+        for j in range(len(ax[0])):
+            BandLineComparePlot(ax[i][j], qb, wb, \
+                          op.optEneScale, Ecenter=op.Ecenter, lod_tol=op.lod_tol, \
+                          rasterized=op.rasterize is not None)
+            ax[i][j].tick_params('x', labelsize=18)
+            ax[i][j].tick_params('y', labelsize=16)
+            ax[i][j].yaxis.label.set_size(22)
+    return fig
+
+def qbwb_table_page(qb, wb, op, Title):
+    fig, ax = MakeAxesTable(pt.bd_table_width, pt.bd_table_height, \
                                margin=pt.bd_table_margin, Title=Title)
     EneScale = np.array(pt.bd_table_ESl).reshape(3,2,3).tolist()
     for i in range(len(ax)):
         for j in range(len(ax[0])):
-            pt.BandComparePlot(ax[i][j], qb_values, wb.values, wb.kpoints, \
-                               EneScale[i][j], Ecenter=op.Ecenter)
-    plt.savefig(pp, format='pdf')
-    fig.clf()
+            BandLineComparePlot(ax[i][j], qb, wb, \
+                               EneScale[i][j], Ecenter=op.Ecenter, lod_tol=op.lod_tol, \
+                               rasterized=op.rasterize is not None)
+    return fig
 
-    #---page2---#
+def qbwb_detail_page(qb, wb, op):
     # 詳細なgridの追加
-    fig, ax = pt.MakeAxesTable(pt.bd_detail_width, pt.bd_detail_height, \
+    fig, ax = MakeAxesTable(pt.bd_detail_width, pt.bd_detail_height, \
                                margin=pt.bd_detail_margin)
     for i in range(len(ax)):
         for j in range(len(ax[0])):
-            pt.BandComparePlot(ax[i][j], qb_values, wb.values, wb.kpoints, \
+            BandLineComparePlot(ax[i][j], qb, wb, \
                                pt.bd_detail_ESl, Ecenter=op.Ecenter, \
-                               detailgrid=True, MinorScale=0.2)
-    plt.savefig(pp, format='pdf')
-    fig.clf()
-
-    pp.close()
-
-
-
-
-
+                               detailgrid=True, MinorScale=0.2, lod_tol=op.lod_tol, \
+                               rasterized=op.rasterize is not None)
+    return fig
 
+def qbwbplot(args=None):
+    ## qb-wb:: qebandとWannierbandの比較を6つの範囲で出力
+    op = plotoption(args)
+    file_pdf = "{}/{}_qb-wb.{}".format(op.SAVE_PATH, op.Prefix, op.fmt)
+    Title = "{}\nQe-WannierBand".format(op.Prefix)
 
+    qb = QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu, op.dtype)
+    wb = WannierBand(op.ef, op.file_labelinfo, op.file_band_dat, op.dtype)
+    #qeのk軸をwannierの高対称点に合わせる(全bandで1回)
+    adjust_qb_kaxis = map_kaxis(qb.kaxis, qb.kpoints[1], wb.kpoints[1])
+    qb = qb.with_kaxis(adjust_qb_kaxis)
+
+    pages = []
+    if len(op.optEneScale) == 3: pages.append((qbwb_single_page, (qb, wb, op)))
+    pages.append((qbwb_table_page, (qb, wb, op, Title)))
+    pages.append((qbwb_detail_page, (qb, wb, op)))
+    with stage('render'):
+        render_pages(pages, file_pdf, op.nproc, op.dpi, op.rasterize)
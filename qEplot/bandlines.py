@@ -0,0 +1,138 @@
+import numpy as np
+
+from qEplot.lazy import pt, plt
+from qEplot.profiler import profiled
+
+#########################
+# ===== BandLines ===== #
+#########################
+#全bandを1つのLineCollectionで描く
+#頂点は bd.segments (nbands, nk, 2) を全panelで共有し, panelごとに変わるのはylimとgridだけ
+#panelのylimと重ならないbandは bd.eindex で除いてから描く
+#軸, 高対称点, grid等は plottool に空のbandを渡して描かせる
+#lod_tol(eV)を指定すると, panelの横方向の解像度(lod_dpi)に合わせてk点を間引く
+#rasterized=Trueならband線だけをbitmapにする(解像度はsavefigのdpi), 軸と文字はvectorのまま
+
+lod_tol = 0.002
+lod_dpi = 300
+
+def band_colors(nbands, bdcolor):
+    #rainbow: 5本ごとに色が変化
+    if bdcolor != 'rainbow': return bdcolor
+    group = np.arange(nbands) // 5
+    return plt.get_cmap('rainbow')(np.linspace(0, 1, group[-1]+1 if nbands else 1))[group]
+
+def band_collection(segments, colors, linewidth=1.0, **kwargs):
+    from matplotlib.collections import LineCollection
+    return LineCollection(segments, colors=colors, linewidths=linewidth, **kwargs)
+
+def decimate_segments(segments, nbucket, tol, keep_k=()):
+    #min/max bucket法: k軸をnbucket個に分け, 各bucketの最初, 最後, 最小, 最大の点だけを残す
+    #bucket内のEの幅がtol以下, または全点が最初と最後を結ぶ直線からtol/2以内なら誤差はtol(eV)以下
+    #どちらでもないbucketは全ての点を残す
+    #keep_k(高対称点)に最も近いk点は必ず残す
+    kaxis = segments[0, :, 0] if len(segments) else np.empty(0)
+    energies = segments[:, :, 1]
+    nk = len(kaxis)
+    if nk <= 4 * nbucket: return segments
+    edges = np.linspace(kaxis[0], kaxis[-1], nbucket+1)
+    bucket = np.clip(np.searchsorted(edges, kaxis, 'right') - 1, 0, nbucket-1)
+    starts = np.flatnonzero(np.diff(bucket, prepend=-1))
+    counts = np.diff(np.append(starts, nk))
+    ends = starts + counts - 1
+    per_point = lambda x: np.repeat(x, counts, axis=-1)
+
+    bmin = per_point(np.minimum.reduceat(energies, starts, axis=1))
+    bmax = per_point(np.maximum.reduceat(energies, starts, axis=1))
+    dk = per_point(kaxis[ends] - kaxis[starts])
+    frac = np.divide(kaxis - per_point(kaxis[starts]), dk, out=np.zeros(nk), where=dk > 0)
+    chord = per_point(energies[:, starts]) + per_point(energies[:, ends] - energies[:, starts]) * frac
+    dev = per_point(np.maximum.reduceat(np.abs(energies - chord), starts, axis=1))
+
+    keep = (energies == bmin) | (energies == bmax) | ((bmax - bmin > tol) & (dev > tol/2))
+    keep[:, starts] = True
+    keep[:, ends] = True
+    if len(keep_k):
+        keep[:, np.abs(kaxis[:, None] - np.asarray(keep_k)[None, :]).argmin(axis=0)] = True
+    return [ seg[kp] for seg, kp in zip(segments, keep) ]
+
+def panel_buckets(ax):
+    #panelの横幅をlod_dpiで換算したpixel数
+    fig = ax.get_figure()
+    return max(1, int(ax.get_position().width * fig.get_figwidth() * lod_dpi))
+
+def lod_segments(ax, bd, sel, tol):
+    if tol is None: return bd.segments[sel]
+    return decimate_segments(bd.segments[sel], panel_buckets(ax), tol, bd.kpoints[1])
+
+def visible_bands(ax, bd):
+    lo, hi = ax.get_ylim()
+    return bd.eindex.select(min(lo, hi), max(lo, hi))
+
+#plottoolの関数もprofileのときstageとして記録する, plottoolは呼ばれたときにimportする
+@profiled('MakeAxesTable')
+def MakeAxesTable(*args, **kwargs):
+    return pt.MakeAxesTable(*args, **kwargs)
+
+@profiled('dos draw')
+def DosPlot(*args, **kwargs):
+    return pt.DosPlot(*args, **kwargs)
+
+@profiled('band draw')
+def ProjBandPlot(*args, **kwargs):
+    return pt.ProjBandPlot(*args, **kwargs)
+
+@profiled('band draw')
+def BandLinePlot(ax, bd, EneScale, bdcolor='rainbow', linewidth=1.0, lod_tol=None, \
+                 rasterized=False, **kwargs):
+    pt.BandSinglePlot(ax, [], bd.kpoints, EneScale, bdcolor=bdcolor, **kwargs)
+    sel = visible_bands(ax, bd)
+    colors = band_colors(len(bd.segments), bdcolor)
+    if not isinstance(colors, str): colors = colors[sel]
+    lc = band_collection(lod_segments(ax, bd, sel, lod_tol), colors, linewidth, rasterized=rasterized)
+    ax.add_collection(lc, autolim=False)
+    return lc
+
+@profiled('band draw')
+def BandLineComparePlot(ax, qb, wb, EneScale, qbcolor='black', wbcolor='red', \
+                        linewidth=1.0, lod_tol=None, rasterized=False, **kwargs):
+    pt.BandComparePlot(ax, [], [], wb.kpoints, EneScale, **kwargs)
+    #qbのk軸はwbに合わせてあるので高対称点はwbのものを使う
+    qb_segments = qb.segments[visible_bands(ax, qb)]
+    if lod_tol is not None:
+        qb_segments = decimate_segments(qb_segments, panel_buckets(ax), lod_tol, wb.kpoints[1])
+    lc_qb = band_collection(qb_segments, qbcolor, linewidth, rasterized=rasterized)
+    lc_wb = band_collection(lod_segments(ax, wb, visible_bands(ax, wb), lod_tol), wbcolor, \
+                            linewidth, linestyles='dashed', rasterized=rasterized)
+    ax.add_collection(lc_qb, autolim=False)
+    ax.add_collection(lc_wb, autolim=False)
+    return lc_qb, lc_wb
+
+@profiled('band draw')
+def BandLineUpdate(ax, lc, bd, bdcolor='rainbow', lod_tol=None, keep_k=None):
+    #--watch: 描いたLineCollectionの頂点と色だけを差し替える, 軸と高対称点はそのまま
+    #完結したbandがまだ無ければ線を消すだけ
+    if len(bd) == 0:
+        lc.set_segments([])
+        return lc
+    sel = visible_bands(ax, bd)
+    segments = bd.segments[sel]
+    if lod_tol is not None:
+        keep_k = bd.kpoints[1] if keep_k is None else keep_k
+        segments = decimate_segments(segments, panel_buckets(ax), lod_tol, keep_k)
+    colors = band_colors(len(bd.segments), bdcolor)
+    if not isinstance(colors, str): colors = colors[sel]
+    lc.set_segments(segments)
+    lc.set_color(colors)
+    return lc
+
+@profiled('dos draw')
+def DosGroupPlot(ax, ds, linewidth=1.0, legendsize=10):
+    #Dos.group_values(元素/軌道ごとのpdos)をDosPlotの上に重ね, 凡例を付ける
+    if len(ds.group_values) == 0: return []
+    colors = plt.get_cmap('tab10')(np.arange(len(ds.group_values)) % 10)
+    lines = []
+    for label, (energy, dos), color in zip(ds.group_labels, ds.group_values, colors):
+        lines += ax.plot(dos, energy, color=color, linewidth=linewidth, label=label)
+    ax.legend(handles=lines, fontsize=legendsize, loc='upper right')
+    return lines
@@ -0,0 +1,130 @@
+
+"""
+Usage:
+  batch.py <dir>... [-r <report>] [-j <nproc>] [-w <window>] [-s <SAVE_PATH>] [-c <bdcolor>] [-e <EneScale>] [-o <Ecenter>] [--lod-tol <eV>] [--no-lod] [--no-cache] [--float32] [--pdos-by <by>] [-f <format>] [--dpi <dpi>] [--rasterize <dpi>] [--profile] [--profile-json <file>]
+
+Options:
+  <dir>            resultの入っているdir, globも可(複数選択可)
+  -r <report>      出力するreport, qb, qbp, qbc, qbm(qbとwbの差を数値で出すだけで描画しない)  [default: qb]
+  -w <window>      qbmで比較するEの範囲, efから下-上(eV)  [default: 2-2]
+  -j <nproc>       同時に描画するdirの数, 0ならcpu数  [default: 0]
+  -s <SAVE_PATH>   保存先                       [default: ./]
+  -c <bdcolor>     bandのcolor, defaultは5本ごとに色が変化  [default: rainbow]
+  -e <EneScale>    任意のEneScale, 1-3-3のように指定    [default: 1-4-4]
+  -o <Ecenter>     Eのグラフの中心, efから何eV離れたところに線を引くか  [default: 0.0]
+  --lod-tol <eV>   k点を間引くときに許す誤差(eV)  [default: 0.002]
+  --no-lod         k点を間引かずに全て描く
+  --no-cache       parse結果のcacheを使わない
+  --float32        bandのEをfloat32で持つ(memoryが半分になる)
+  --pdos-by <by>   qbpでpdos_atmを元素ごと(element)か元素と軌道ごと(orbital)に重ねる
+  -f <format>      出力形式, pdf, png, svg  [default: pdf]
+  --dpi <dpi>      pngで保存するときのdpi  [default: 200]
+  --rasterize <dpi>  band線だけをこのdpiのbitmapにする, 軸と文字はvectorのまま
+  --profile        stageごとの時間とmemoryを表で出力する(QEPLOT_PROFILE=1でも可)
+  --profile-json <file>  stageごとの時間とmemoryをjsonに書き出す
+"""
+
+from docopt import docopt
+import os
+import glob
+import time
+import importlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import qEplot.profiler as profiler
+from qEplot.discovery import Manifest
+
+#report: (module, 関数)
+reports = { 'qb': ('qEplot.banddos_plot_pdf', 'bandplot'), \
+            'qbp': ('qEplot.banddos_plot_pdf', 'banddosplot'), \
+            'qbc': ('qEplot.banddos_plot_pdf', 'qbwbplot'), \
+            'qbm': ('qEplot.bandcompare', 'deviation_report') }
+
+def expand_dirs(patterns):
+    dirlist = []
+    for pattern in patterns:
+        for dir in sorted(glob.glob(pattern)) or [ pattern ]:
+            if dir not in dirlist: dirlist.append(dir)
+    return dirlist
+
+def report_prefixes(dirlist):
+    #出力名はscf.outのprefixで決まるので, 同じprefix(pwscf等)のdirは同じSAVE_PATHで上書きし合う
+    #重なるdirだけprefixにdir名(それも重なればdirの番号)を付ける
+    #return: {dir: Prefix}, 重ならないdirは入れない(scf.outから決める)
+    prefix = {}
+    for dir in dirlist:
+        file_scf_out = Manifest([dir]).get('scf_out') if os.path.isdir(dir) else None
+        if file_scf_out is not None:
+            prefix[dir] = os.path.basename(file_scf_out).replace(".scf.out", "")
+    count = Counter(prefix.values())
+    names = { dir: p for dir, p in prefix.items() if count[p] == 1 }
+    for dir, p in prefix.items():
+        if count[p] > 1: names[dir] = "{}_{}".format(p, os.path.basename(os.path.abspath(dir)))
+    count = Counter(names.values())
+    for i, dir in enumerate(dirlist):
+        if dir in names and count[names[dir]] > 1: names[dir] = "{}_{}".format(prefix[dir], i+1)
+    return { dir: name for dir, name in names.items() if name != prefix[dir] }
+
+def report_args(dir, args, prefix=""):
+    #banddos_plot_pdf.plotoption, bandcompare.compareoptionに渡すdict, docoptは通さない
+    return { '<dir>': dir, '-d': [], '-p': prefix, '-s': args['-s'], '-c': args['-c'], \
+             '-e': args['-e'], '-o': args['-o'], '-j': '1', '--lod-tol': args['--lod-tol'], \
+             '--no-lod': args['--no-lod'], '--no-cache': args['--no-cache'], '--float32': args['--float32'], \
+             '--pdos-by': args['--pdos-by'], '-f': args['-f'], '--dpi': args['--dpi'], \
+             '--rasterize': args['--rasterize'], '-w': args['-w'], '--json': True, \
+             '--profile': False, '--profile-json': None }
+
+def render_report(report, dir, args, profile=False, prefix=""):
+    #worker process: 1つのdirのreportを描く, 失敗しても例外を返すだけで止めない
+    #profile中はstageの記録も返す
+    #prefix: 出力名, ""ならscf.outのprefix
+    profiler.reset(profile)
+    start = time.perf_counter()
+    try:
+        module, func = reports[report]
+        with profiler.stage('import'):
+            module = importlib.import_module(module)
+        if not os.path.isdir(dir): raise NotADirectoryError(dir)
+        result = getattr(module, func)(report_args(dir, args, prefix))
+        status = "ok"
+        if prefix != "": status += "  -> {}".format(prefix)
+        #qbmは全体のrms, maxを並べる
+        if isinstance(result, dict) and 'overall' in result:
+            status += "  rms {:.2f} meV, max {:.2f} meV".format( \
+                      result['overall']['rms']*1e3, result['overall']['max']*1e3)
+    except Exception as err:
+        status = "{}: {}".format(type(err).__name__, err)
+    return dir, status, time.perf_counter() - start, profiler.records
+
+def batchplot():
+    args = docopt(__doc__)
+    profiler.setup(args)
+    if args['-r'] not in reports:
+        print("report must be one of {}".format(", ".join(reports)))
+        return 1
+    dirlist = expand_dirs(args['<dir>'])
+    nproc = int(args['-j']) or None
+    with profiler.stage('discovery'):
+        prefixes = report_prefixes(dirlist)
+
+    results = []
+    with profiler.stage('reports'), ProcessPoolExecutor(max_workers=nproc) as pool:
+        jobs = [ pool.submit(render_report, args['-r'], dir, args, profiler.enabled, prefixes.get(dir, "")) \
+                 for dir in dirlist ]
+        for job in jobs:
+            dir, status, sec, records = job.result()
+            print("{:8.2f}s  {}  {}".format(sec, dir, status), flush=True)
+            results.append((dir, status, sec))
+            profiler.merge(records)
+
+    #----- summary -----#
+    width = max([ len(r[0]) for r in results ] + [3])
+    print("\n{:<{w}}  {:>8}  {}".format("dir", "time[s]", "status", w=width))
+    for dir, status, sec in results:
+        print("{:<{w}}  {:8.2f}  {}".format(dir, sec, status, w=width))
+    nfail = sum( not status.startswith("ok") for _, status, _ in results )
+    print("{} dirs, {} ok, {} failed".format(len(results), len(results)-nfail, nfail))
+    return 1 if nfail else 0
+
+if __name__=='__main__': batchplot()
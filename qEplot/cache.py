@@ -0,0 +1,127 @@
+import os
+import json
+import shutil
+import hashlib
+import functools
+import numpy as np
+
+#####################
+# ===== Cache ===== #
+#####################
+#parse結果をcache_dir/<key>/に保存する
+#  item<n>.npy: ndarray (np.loadでmmapして読む)
+#  meta.json  : source fileのsize, mtime, hashとndarray以外の値
+#QEPLOT_NO_CACHE=1 または各entry pointの--no-cacheで無効化
+#cacheが古いかはsize, mtimeと先頭, 末尾のblockのhash(edge_hash)で判断する, 全体のhashではない
+#  mtimeを保ったまま(touch -d, rsync等)fileの途中だけを同じ長さで書き換えると古い結果が返る
+#  そのようなfileを読むときはQEPLOT_NO_CACHE=1か--no-cacheにする
+
+enabled = os.environ.get('QEPLOT_NO_CACHE', '') == ''
+cache_dir = os.environ.get('QEPLOT_CACHE_DIR', os.path.join( \
+                os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'qEplot'))
+max_bytes = int(float(os.environ.get('QEPLOT_CACHE_MB', 512)) * 2**20)
+hash_block = 2**20
+
+def edge_hash(file):
+    #先頭と末尾のblockだけhashする(巨大なscf.outでも全読みしない), 途中の変更は見ない
+    h = hashlib.sha1()
+    with open(file, 'rb') as f:
+        h.update(f.read(hash_block))
+        if f.seek(0, 2) > 2 * hash_block:
+            f.seek(-hash_block, 2)
+            h.update(f.read(hash_block))
+    return h.hexdigest()
+
+def source_info(file):
+    st = os.stat(file)
+    return { 'path': os.path.abspath(file), 'size': st.st_size, \
+             'mtime': st.st_mtime_ns, 'hash': edge_hash(file) }
+
+def _entry_dir(kind, files):
+    key = hashlib.sha1(json.dumps([kind] + [ os.path.abspath(f) for f in files ]).encode())
+    return os.path.join(cache_dir, "{}-{}".format(kind, key.hexdigest()[:20]))
+
+def _is_fresh(meta, files):
+    for src, file in zip(meta['sources'], files):
+        st = os.stat(file)
+        if src['size'] != st.st_size or src['mtime'] != st.st_mtime_ns: return False
+        if src['hash'] != edge_hash(file): return False
+    return len(meta['sources']) == len(files)
+
+def load(kind, files):
+    #cacheがあれば(結果, True), なければ(None, False)
+    entry = _entry_dir(kind, files)
+    try:
+        with open(os.path.join(entry, 'meta.json'), 'r') as f_meta:
+            meta = json.load(f_meta)
+        if not _is_fresh(meta, files):
+            shutil.rmtree(entry, ignore_errors=True)
+            return None, False
+        items = []
+        for n, item in enumerate(meta['items']):
+            if item == '@npy':
+                items.append(np.load(os.path.join(entry, "item{}.npy".format(n)), mmap_mode='r'))
+            else: items.append(item)
+        os.utime(os.path.join(entry, 'meta.json'))
+    except (OSError, ValueError, KeyError):
+        return None, False
+    return (items[0] if meta['single'] else tuple(items)), True
+
+def store(kind, files, result, sources=None):
+    entry = _entry_dir(kind, files)
+    tmp = "{}.tmp{}".format(entry, os.getpid())
+    single = not isinstance(result, tuple)
+    items = [ result ] if single else list(result)
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        meta = { 'sources': sources or [ source_info(f) for f in files ], \
+                 'single': single, 'items': [] }
+        for n, item in enumerate(items):
+            if isinstance(item, np.ndarray):
+                np.save(os.path.join(tmp, "item{}.npy".format(n)), item)
+                meta['items'].append('@npy')
+            else: meta['items'].append(item)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f_meta:
+            json.dump(meta, f_meta)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.rename(tmp, entry)
+    except (OSError, TypeError, ValueError):
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+    evict()
+
+def evict(limit=None):
+    #合計sizeがlimitを超えたら最後に使われたのが古いentryから消す
+    limit = max_bytes if limit is None else limit
+    entries = []
+    with os.scandir(cache_dir) as it:
+        for de in it:
+            if not de.is_dir() or '.tmp' in de.name: continue
+            try:
+                size = sum( f.stat().st_size for f in os.scandir(de.path) )
+                used = os.stat(os.path.join(de.path, 'meta.json')).st_mtime
+            except OSError: continue
+            entries.append((used, size, de.path))
+    total = sum( e[1] for e in entries )
+    for used, size, path in sorted(entries):
+        if total <= limit: break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+
+def cached(kind, files, loader):
+    if not enabled: return loader()
+    result, hit = load(kind, files)
+    if hit: return result
+    sources = [ source_info(f) for f in files ]
+    result = loader()
+    store(kind, files, result, sources)
+    return result
+
+def cached_reader(kind):
+    #file名だけを引数にとるreaderをcacheする
+    def deco(func):
+        @functools.wraps(func)
+        def wrapper(*files):
+            return cached(kind, files, lambda: func(*files))
+        return wrapper
+    return deco
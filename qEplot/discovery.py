@@ -0,0 +1,100 @@
+import os
+import re
+import json
+import hashlib
+
+import qEplot.cache as cache
+
+#########################
+# ===== Discovery ===== #
+#########################
+#resultのdirを1回だけscandirし, fileを種類ごとに分類する
+#分類結果はdirのmtimeが変わるまでcacheする
+
+#判定順はplotoptionの if/elif と同じ
+suffix_kind = [ ('.scf.out', 'scf_out'), ('.nscf.in', 'nscf_in'), \
+                ('.band.out', 'band_out'), ('.band.gnu', 'band_gnu'), \
+                ('_band.dat', 'band_dat'), ('.labelinfo.dat', 'labelinfo'), \
+                ('.pdos_tot', 'pdos_tot'), ('.pdos_atm#', 'pdos_atm'), ('projwfc.out', 'projwfc'), \
+                ('wout', 'wout') ]
+
+#suffix_kind, peek_calculationを変えたら上げる, 古いmanifestは読み直す
+manifest_version = 4
+
+def classify(name):
+    for suffix, kind in suffix_kind:
+        if suffix in name: return kind
+    return None
+
+_calculation = re.compile(r"calculation\s*=\s*['\"](\w+)['\"]", re.I)
+
+def peek_calculation(file_in):
+    #&controlのnamelistだけを読んでcalculationを返す
+    #1行に複数の変数(calculation='bands', prefix='Fe')や '!' のcommentがあってもよい
+    with open(file_in, 'r') as f_in:
+        for line in f_in:
+            line = line.split('!')[0].strip()
+            if line.startswith('/') or line.lower().startswith('&system'): break
+            m = _calculation.search(line)
+            if m is not None: return m.group(1)
+    return None
+
+def _manifest_file(dir):
+    key = hashlib.sha1(os.path.abspath(dir).encode()).hexdigest()[:20]
+    return os.path.join(cache.cache_dir, "manifest-{}.json".format(key))
+
+def _load_manifest(dir):
+    try:
+        with open(_manifest_file(dir), 'r') as f_mf:
+            mf = json.load(f_mf)
+        if mf.get('version') != manifest_version: return None
+        if mf['mtime'] != os.stat(dir).st_mtime_ns: return None
+        for name, mtime in mf['peek'].items():
+            if os.stat(os.path.join(dir, name)).st_mtime_ns != mtime: return None
+    except (OSError, ValueError, KeyError):
+        return None
+    return mf
+
+def _store_manifest(dir, mf):
+    file_mf = _manifest_file(dir)
+    try:
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        with open(file_mf + '.tmp{}'.format(os.getpid()), 'w') as f_mf:
+            json.dump(mf, f_mf)
+        os.replace(file_mf + '.tmp{}'.format(os.getpid()), file_mf)
+    except OSError:
+        pass
+
+def scan_dir(dir):
+    #return: {'version':.., 'mtime':.., 'files': [[name, kind], ...], 'peek': {name: mtime}}
+    if cache.enabled:
+        mf = _load_manifest(dir)
+        if mf is not None: return mf
+    mf = { 'version': manifest_version, 'mtime': os.stat(dir).st_mtime_ns, 'files': [], 'peek': {} }
+    with os.scandir(dir) as it:
+        entries = sorted( (de.name, de) for de in it if de.is_file() )
+    for name, de in entries:
+        kind = classify(name)
+        if kind is None: continue
+        if kind == 'nscf_in':
+            mf['peek'][name] = de.stat().st_mtime_ns
+            if peek_calculation(de.path) != 'bands': continue
+        mf['files'].append([name, kind])
+    if cache.enabled: _store_manifest(dir, mf)
+    return mf
+
+class Manifest:
+    def __init__(self, dirlist):
+        self.dirlist = dirlist
+        self.files = {}
+        for dir in dirlist:
+            for name, kind in scan_dir(dir)['files']:
+                self.files.setdefault(kind, []).append(os.path.join(dir, name))
+
+    def get(self, kind):
+        #同じ種類が複数あるときは最後のもの
+        files = self.files.get(kind)
+        return files[-1] if files else None
+
+    def all(self, kind):
+        return self.files.get(kind, [])
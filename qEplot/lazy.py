@@ -0,0 +1,31 @@
+import importlib
+
+####################
+# ===== Lazy ===== #
+####################
+#plottool, pyplotは最初に属性を参照したときにimportする
+#ptはimport直後にmpl_initを1回だけ呼ぶ. pltもpt(mpl_init)を済ませてから使う
+#qb --help や readdataだけを使うscriptではmatplotlibを読み込まない
+
+class LazyModule:
+    def __init__(self, name, init=None):
+        self._name = name
+        self._init = init
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            module = importlib.import_module(self._name)
+            if self._init is not None: self._init(module)
+            self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return "<LazyModule {} ({})>".format(self._name, state)
+
+pt = LazyModule('plottool', init=lambda module: module.mpl_init())
+plt = LazyModule('matplotlib.pyplot', init=lambda module: pt._load())
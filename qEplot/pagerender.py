@@ -0,0 +1,104 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import qEplot.profiler as profiler
+from qEplot.lazy import plt
+
+def _pdf_writer():
+    #pypdfは並列に描くときだけimportする
+    try:
+        from pypdf import PdfWriter
+    except ImportError:
+        return None
+    return PdfWriter
+
+##########################
+# ===== PageRender ===== #
+##########################
+#pages: [(page関数, 引数), ...]
+#page関数は読み込み済みのdata(QeBand等)からfigを作って返す
+#pdf: 各pageを別processで1pageのpdfに描き, 最後に順番通り結合する
+#     pypdfが無いとき, processes=1のときは1つのPdfPagesに順に描く
+#png, svg: pageごとに <名前>_p<番号>.<拡張子> に描く(1pageなら名前そのまま)
+#profile中はpageごとにdraw, savefigのstageを記録し, workerの記録は親に集める
+
+formats = ('pdf', 'png', 'svg')
+
+def headless():
+    #画面の無いnodeでも描けるようにAggを使う, pyplotのimport前に呼ぶ
+    import matplotlib
+    matplotlib.use('Agg')
+
+def output_format(file_out):
+    fmt = os.path.splitext(file_out)[1].lstrip('.').lower()
+    if fmt not in formats:
+        raise ValueError("output format must be one of {}: {}".format(", ".join(formats), file_out))
+    return fmt
+
+def savefig_dpi(fmt, dpi=None, rasterize=None):
+    #pngは全体のdpi, pdf, svgではrasterizedにしたartistだけがこのdpiになる
+    if fmt == 'png': return dpi or 'figure'
+    return rasterize or 'figure'
+
+def save_figure(fig, file_out, dpi=None, rasterize=None):
+    fmt = output_format(file_out)
+    fig.savefig(file_out, format=fmt, dpi=savefig_dpi(fmt, dpi, rasterize))
+
+def page_files(file_out, npage):
+    if npage == 1: return [ file_out ]
+    base, ext = os.path.splitext(file_out)
+    return [ "{}_p{}{}".format(base, n+1, ext) for n in range(npage) ]
+
+def _draw_page(func, args, out, fmt='pdf', dpi='figure'):
+    with profiler.stage('draw'):
+        fig = func(*args)
+    with profiler.stage('savefig'):
+        fig.savefig(out, format=fmt, dpi=dpi)
+    plt.close(fig)
+
+def _render_page(func, args, file_page, profile=False, fmt='pdf', dpi='figure'):
+    profiler.reset(profile)
+    with profiler.stage('page'):
+        _draw_page(func, args, file_page, fmt, dpi)
+    return file_page, profiler.records
+
+def _render_parallel(pages, files_page, processes, fmt, dpi):
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        jobs = [ pool.submit(_render_page, func, args, file_page, profiler.enabled, fmt, dpi) \
+                 for (func, args), file_page in zip(pages, files_page) ]
+        for job in jobs: profiler.merge(job.result()[1])
+
+def render_pdf(pages, file_pdf, processes=None, dpi='figure'):
+    PdfWriter = None if processes == 1 or len(pages) < 2 else _pdf_writer()
+    if PdfWriter is None:
+        from matplotlib.backends.backend_pdf import PdfPages
+        with PdfPages(file_pdf) as pp:
+            for func, args in pages:
+                with profiler.stage('page'):
+                    _draw_page(func, args, pp, 'pdf', dpi)
+        return
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(file_pdf))) as tmp:
+        files_page = [ os.path.join(tmp, "page{}.pdf".format(n)) for n in range(len(pages)) ]
+        _render_parallel(pages, files_page, processes, 'pdf', dpi)
+        with profiler.stage('merge'):
+            writer = PdfWriter()
+            for file_page in files_page: writer.append(file_page)
+            with open(file_pdf, 'wb') as f_pdf:
+                writer.write(f_pdf)
+
+def render_pages(pages, file_out, processes=None, dpi=None, rasterize=None):
+    #file_outの拡張子で形式を決める, return: 書き出したfile
+    fmt = output_format(file_out)
+    savedpi = savefig_dpi(fmt, dpi, rasterize)
+    if fmt == 'pdf':
+        render_pdf(pages, file_out, processes, savedpi)
+        return [ file_out ]
+    files_page = page_files(file_out, len(pages))
+    if processes == 1 or len(pages) < 2:
+        for (func, args), file_page in zip(pages, files_page):
+            with profiler.stage('page'):
+                _draw_page(func, args, file_page, fmt, savedpi)
+    else:
+        _render_parallel(pages, files_page, processes, fmt, savedpi)
+    return files_page
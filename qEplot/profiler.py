@@ -0,0 +1,148 @@
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+########################
+# ===== Profiler ===== #
+########################
+#with stage('name'): ... で囲んだ区間のwall time, cpu time(子processを含む), peak RSSを記録する
+#--profile または QEPLOT_PROFILE=1 で有効, 終了時に表をstderrに出す
+#--profile-json <file> または QEPLOT_PROFILE=<file>.json でjsonに書き出す
+#無効のときstageは共有のnullcontextを返すだけ
+
+enabled = False
+file_json = None
+records = []
+_depth = 0
+_null = contextlib.nullcontext()
+
+def peak_rss_mb():
+    #これまでの最大RSS(MB), linuxはKB, macはbyteで返る
+    if resource is None: return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == 'darwin' else rss / 2**10
+
+def _cpu():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+class _Stage:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        global _depth
+        self.depth = _depth
+        _depth += 1
+        self.rss = peak_rss_mb()
+        self.cpu = _cpu()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        global _depth
+        _depth -= 1
+        rss = peak_rss_mb()
+        records.append({ 'stage': self.name, 'depth': self.depth, \
+                         'wall': time.perf_counter() - self.wall, 'cpu': _cpu() - self.cpu, \
+                         'peak_rss_mb': rss, \
+                         'rss_growth_mb': None if rss is None else rss - self.rss })
+        return False
+
+def stage(name):
+    if not enabled: return _null
+    return _Stage(name)
+
+def profiled(name):
+    #関数全体をstageにする, 無効のときはenabledを見るだけ
+    def deco(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled: return func(*args, **kwargs)
+            with _Stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return deco
+
+def enable(json_out=None):
+    global enabled, file_json
+    if not enabled: atexit.register(report)
+    enabled = True
+    file_json = json_out or file_json
+
+def setup(args=None):
+    #entry pointのargs(--profile, --profile-json)と環境変数から有効にする
+    env = os.environ.get('QEPLOT_PROFILE', '')
+    if env not in ('', '0'):
+        enable(env if env.endswith('.json') else None)
+    if args is not None and (args.get('--profile') or args.get('--profile-json')):
+        enable(args.get('--profile-json'))
+
+def reset(enable_worker=False):
+    #worker process用: forkで引き継いだ親の記録を捨て, 深さ0から測る(reportはしない)
+    global enabled, records, _depth
+    enabled = enable_worker
+    records = []
+    _depth = 0
+
+def merge(sub):
+    #worker processの記録を今のstageの下に加える
+    for rec in sub:
+        rec = dict(rec)
+        rec['depth'] += _depth
+        records.append(rec)
+
+def report():
+    if not records: return
+    #記録は終了順なので, 開始順(親が先)に並べ直し, 同じ親の下の同名stageはまとめる
+    ordered = _aggregate(_start_order(records))
+    if file_json is not None:
+        with open(file_json, 'w') as f_json:
+            json.dump({ 'argv': sys.argv, 'pid': os.getpid(), 'stages': ordered }, f_json, indent=1)
+        return
+    width = max( 2*r['depth'] + len(r['stage']) for r in ordered )
+    print("\n{:<{w}}  {:>6}  {:>9}  {:>9}  {:>10}  {:>10}".format( \
+          "stage", "calls", "wall[s]", "cpu[s]", "peakRSS[MB]", "+RSS[MB]", w=width), file=sys.stderr)
+    for r in ordered:
+        rss = "-" if r['peak_rss_mb'] is None else "{:.1f}".format(r['peak_rss_mb'])
+        grow = "-" if r['rss_growth_mb'] is None else "{:.1f}".format(r['rss_growth_mb'])
+        print("{:<{w}}  {:6d}  {:9.3f}  {:9.3f}  {:>10}  {:>10}".format( \
+              "  "*r['depth'] + r['stage'], r['calls'], r['wall'], r['cpu'], rss, grow, w=width), file=sys.stderr)
+
+def _start_order(recs):
+    #子は親より先に終わる(後順)ので, 前順(親の直後に子)に並べ直す
+    stack = []
+    for rec in recs:
+        children = []
+        while stack and stack[-1][0] > rec['depth']:
+            children = stack.pop()[1] + children
+        stack.append((rec['depth'], [rec] + children))
+    return [ r for _, group in stack for r in group ]
+
+def _aggregate(ordered):
+    #親から辿ったstage名のpathが同じものを足し合わせる(peak RSSは最大)
+    merged = {}
+    path = []
+    for rec in ordered:
+        del path[rec['depth']:]
+        path.append(rec['stage'])
+        key = tuple(path)
+        if key not in merged:
+            merged[key] = dict(rec, calls=0, wall=0.0, cpu=0.0)
+        m = merged[key]
+        m['calls'] += 1
+        m['wall'] += rec['wall']
+        m['cpu'] += rec['cpu']
+        if rec['peak_rss_mb'] is not None:
+            m['peak_rss_mb'] = max(m['peak_rss_mb'], rec['peak_rss_mb'])
+            m['rss_growth_mb'] = max(m['rss_growth_mb'], rec['rss_growth_mb'])
+    return list(merged.values())
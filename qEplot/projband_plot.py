@@ -1,43 +1,40 @@
 
 """
 Usage:
-  projband_plot.py <dir> [-e <EneScale>] [-o <Ecenter>]
-  projband_plot.py (-d <dir>...) [-e <EneScale>] [-o <Ecenter>]
+  projband_plot.py <dir> [--proj <sel>]... [-e <EneScale>] [-o <Ecenter>] [-s <SAVE_PDF>] [-j <nproc>] [--no-cache] [--dpi <dpi>] [--rasterize <dpi>] [--profile] [--profile-json <file>]
+  projband_plot.py (-d <dir>...) [--proj <sel>]... [-e <EneScale>] [-o <Ecenter>] [-s <SAVE_PDF>] [-j <nproc>] [--no-cache] [--dpi <dpi>] [--rasterize <dpi>] [--profile] [--profile-json <file>]
 
 Options:
   -d <dir>         resultの入っているdir(複数選択可)
+  --proj <sel>     QEのprojwfc.outの射影をweightにして描く, 原子番号か元素と:lを','でつなぐ
+                   (例 Fe:d, 3:p, O:s,O:p), 複数指定でgraphを並べる
+                   指定しないときはWannierのWFごとの_band.datを描く
   -e <EneScale>    任意のEneScale, 1-3-3のように指定, 指定すると1ページ目に新たにページを追加し、1つのグラフをplot    [default: 1-4-4]
   -o <Ecenter>     Eのグラフの中心, efから何eV離れたところに線を引くか  [default: 0.0]
+  -s <SAVE_PDF>    出力先, 拡張子(pdf, png, svg)で形式を決める, png, svgはpageごとに別file
+                   指定しないときWFが1pageに収まらなければpjband.pdfに出力  [default: ]
+  -j <nproc>       band fileを並列に読むprocess数, 0ならcpu数  [default: 0]
+  --no-cache       parse結果のcacheを使わない
+  --dpi <dpi>      pngで保存するときのdpi  [default: 200]
+  --rasterize <dpi>  bandの点だけをこのdpiのbitmapにする, 軸と文字はvectorのまま
+  --profile        stageごとの時間とmemoryを表で出力する(QEPLOT_PROFILE=1でも可)
+  --profile-json <file>  stageごとの時間とmemoryをjsonに書き出す
 """
 
 from docopt import docopt
 import os
 import glob
 import numpy as np
-from matplotlib import pyplot as plt
-from matplotlib import axes as a
-from matplotlib.backends.backend_pdf import PdfPages
-
-import plottool as pt
-import qEplot.banddos_plot as qp
-pt.mpl_init()
-
-def read_wout(file_wout):
-    with open(file_wout, 'r') as f_wout:
-        lines = f_wout.readlines()
-    flag, WF_dict = 0, {}
-    for line in lines:
-        if 'Final State' in line: flag = 1
-        if 'WF centre and spread' in line and flag == 1:
-            WF_No = int(line.split()[4])
-            if len(line.split()[11:]) == 0:
-                WF_dict[WF_No] = "WF{}".format(WF_No)
-            else :
-                for i, wstr in enumerate(line.split()[11:]):
-                    if i == 0: WF_dict[WF_No] = wstr
-                    else : WF_dict[WF_No] += '_' + wstr
-    return WF_dict
+from concurrent.futures import ProcessPoolExecutor
 
+import qEplot.readdata as rd
+from qEplot.lazy import plt
+from qEplot.readdata import read_wout
+import qEplot.cache as cache
+from qEplot.profiler import stage, setup as profile_setup
+from qEplot.discovery import Manifest
+from qEplot.bandlines import MakeAxesTable, ProjBandPlot
+from qEplot.pagerender import headless, output_format, page_files, savefig_dpi
 
 ######################
 class plotoption():
@@ -46,53 +43,159 @@ class plotoption():
         args = docopt(__doc__)
         self.optEneScale = [ float(x) for x in args['-e'].split('-') ]
         self.Ecenter = float(args['-o'])
+        self.SAVE_PDF = args['-s']
+        self.nproc = int(args['-j']) or None
+        self.dpi = float(args['--dpi'])
+        self.rasterize = None if args['--rasterize'] is None else float(args['--rasterize'])
+        if self.SAVE_PDF != "": output_format(self.SAVE_PDF)
+        if args['--no-cache']: cache.enabled = False
+        profile_setup(args)
 
-        self.file_band_dat = []
-        files = []
-        self.WF_No = []
         if type(args['<dir>']) != list :
             dirlist = [ args['<dir>'] ]
         else: dirlist = args['<dir>'].copy()
         print(dirlist)
-        for dir in dirlist: files = files + pt.filelist(dir)
-        for file in files:
-            if   ".scf.out" in file: self.file_scf_out=file
-            elif "_band.dat" in file: self.file_band_dat.append(file)
-            elif ".labelinfo.dat" in file: self.file_labelinfo=file
-            elif "wout" in file: self.WF_dict = read_wout(file)
+        with stage('discovery'):
+            files = Manifest(dirlist)
+        self.file_scf_out = files.get('scf_out')
+        self.proj = args['--proj']
+        if len(self.proj) != 0:
+            #projwfc.x: QEのband(band.gnu)にk点ごとの射影を載せる
+            self.file_nscf_in = files.get('nscf_in')
+            self.file_band_out = files.get('band_out')
+            self.file_band_gnu = files.get('band_gnu')
+            self.file_projwfc = files.get('projwfc')
+        else:
+            self.read_wf_files(files, dirlist)
+        with stage('scf_out'):
+            self.totE, self.ef, self.totM, self.absM = rd.read_scf_out(self.file_scf_out)
+
+    def read_wf_files(self, files, dirlist):
+        self.file_band_dat = files.all('band_dat')
+        self.file_labelinfo = files.get('labelinfo')
+        with stage('wout'):
+            self.WF_dict = read_wout(files.get('wout'))
+        self.WF_No = []
 
         for fbd in self.file_band_dat:
             for i, dir in enumerate(dirlist): 
                 if i == 0: wfn = fbd.replace(dir, "").replace("_band.dat", "").replace("/", "")
                 else:      wfn = wfn.replace(dir, "")
             self.WF_No.append(int(wfn.replace("WF", "")))
-        self.totE, self.ef, self.totM, self.absM = pt.read_scf_out(self.file_scf_out)
+        #WFの番号順に並べる
+        order = sorted(range(len(self.WF_No)), key=lambda n: self.WF_No[n])
+        self.file_band_dat = [ self.file_band_dat[n] for n in order ]
+        self.WF_No = [ self.WF_No[n] for n in order ]
 
-def bandplot():
-    op = plotoption()
+#1pageに描くWFの最大数
+page_graphnum = 12
 
-    graphnum = len(op.file_band_dat)
+def graph_layout(graphnum):
     ### graph数に応じて横幅や余白等を決める ###
-    if   graphnum == 1 : wn, hn, w, h, m, ts, ls = [1] * 1, [1] * 1, 18, 20, 2.0, 18, 22
-    elif graphnum <= 2 : wn, hn, w, h, m, ts, ls = [1] * 2, [1] * 1, 30, 20, 2.5, 18, 20
-    elif graphnum <= 4 : wn, hn, w, h, m, ts, ls = [1] * 2, [1] * 2, 25, 20, 1.5, 15, 16
-    elif graphnum <= 6 : wn, hn, w, h, m, ts, ls = [1] * 3, [1] * 2, 30, 20, 1.5, 15, 16
-    elif graphnum <= 9 : wn, hn, w, h, m, ts, ls = [1] * 3, [1] * 3, 23, 20, 1.0, 11, 9
-    elif graphnum <= 12: wn, hn, w, h, m, ts, ls = [1] * 4, [1] * 3, 30, 20, 1.0, 11, 9
-    fig, ax = pt.MakeAxesTable(wn, hn, width=w, height=h, margin=m)
-
-    for n, fbd in enumerate(op.file_band_dat):
-        bd = qp.WannierBand(op.ef, op.file_labelinfo, fbd)
+    if   graphnum == 1 : return [1] * 1, [1] * 1, 18, 20, 2.0, 18, 22
+    elif graphnum <= 2 : return [1] * 2, [1] * 1, 30, 20, 2.5, 18, 20
+    elif graphnum <= 4 : return [1] * 2, [1] * 2, 25, 20, 1.5, 15, 16
+    elif graphnum <= 6 : return [1] * 3, [1] * 2, 30, 20, 1.5, 15, 16
+    elif graphnum <= 9 : return [1] * 3, [1] * 3, 23, 20, 1.0, 11, 9
+    else               : return [1] * 4, [1] * 3, 30, 20, 1.0, 11, 9
+
+def load_wf_bands(files_band_dat, ef, nproc=None):
+    #各WFの_band.datを並列に読み, 1つの配列にまとめる
+    #return: kaxis(nk), energies(nWF, nbands, nk), extra(nWF, ncol-2, nbands, nk)
+    if nproc == 1 or len(files_band_dat) < 2:
+        tables = [ rd.load_band_table(f) for f in files_band_dat ]
+    else:
+        with ProcessPoolExecutor(max_workers=nproc) as pool:
+            tables = list(pool.map(rd.load_band_table, files_band_dat))
+    kaxis = np.array(tables[0][0])
+    energies = np.stack([ t[1] for t in tables ]) - ef
+    extra = np.stack([ t[2] for t in tables ])
+    return kaxis, energies, extra
+
+def wf_bands(kaxis, energies, extra, kpoints, ef):
+    #WFごとのBandStructure, kaxisは共有, energies, extraはWFの行のview
+    return [ rd.BandStructure(kaxis, energies[n], extra[n], kpoints[0], kpoints[1], ef) \
+             for n in range(len(energies)) ]
+
+def proj_bands(op):
+    #projwfc.outをspecごとの(nbands, nk)のweightにし, QEのbandと組にする
+    #lsda(k点がup, downの順に2倍)ではspinごとに分け, band.gnuは片方のspinしか無いのでprojwfc.outのEで描く
+    #return: BandStructureのlist, graphのlabel
+    qb = rd.QeBand(op.ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu)
+    with stage('projwfc'):
+        energies, weights = rd.read_projwfc(op.file_projwfc, op.proj)
+    if energies.shape[1] == 2*qb.nk:
+        bands, labels = [], []
+        for spec, w in zip(op.proj, weights):
+            for spin, k in (('up', slice(0, qb.nk)), ('down', slice(qb.nk, None))):
+                bands.append(rd.BandStructure(qb.kaxis, energies[:, k] - float(op.ef), w[None, :, k], \
+                                              qb.labels, qb.ticks, op.ef))
+                labels.append("{} ({})".format(spec, spin))
+        return bands, labels
+    if energies.shape[1] != qb.nk:
+        raise ValueError("{}: k点の数({})がband.gnu({})と違います".format( \
+                         op.file_projwfc, energies.shape[1], qb.nk))
+    nb = min(len(qb), len(energies))
+    bands = [ rd.BandStructure(qb.kaxis, qb.energies[:nb], w[None, :nb], qb.labels, qb.ticks, op.ef) \
+              for w in weights ]
+    return bands, list(op.proj)
+
+def projband_page(bands, labels, op, graphnum):
+    wn, hn, w, h, m, ts, ls = graph_layout(graphnum)
+    fig, ax = MakeAxesTable(wn, hn, width=w, height=h, margin=m)
+    for n, bd in enumerate(bands):
         i = n // len(wn)
         j = n % len(wn)
-        pt.ProjBandPlot(ax[i][j], fig, bd.values, bd.kpoints, op.optEneScale, Ecenter=op.Ecenter)
+        ProjBandPlot(ax[i][j], fig, bd.values, bd.kpoints, op.optEneScale, Ecenter=op.Ecenter)
+        if op.rasterize is not None:
+            for coll in ax[i][j].collections: coll.set_rasterized(True)
         ax[i][j].tick_params('x', labelsize=ls)
         ax[i][j].tick_params('y', labelsize=ls)
         ax[i][j].set_ylabel("")
-        ax[i][j].annotate(op.WF_dict[op.WF_No[n]], (0.5, 1.01), xycoords='axes fraction', fontsize=ts, va='bottom', ha='center')
+        ax[i][j].annotate(labels[n], (0.5, 1.01), xycoords='axes fraction', fontsize=ts, va='bottom', ha='center')
     #fig.colorbar(sc)
-    plt.show()
+    return fig
 
-if __name__=='__main__': bandplot()
+def bandplot():
+    op = plotoption()
 
+    if len(op.proj) != 0:
+        bands, labels = proj_bands(op)
+    else:
+        with stage('band parse'):
+            kpoints = rd.read_labelinfo(op.file_labelinfo)
+            kaxis, energies, extra = load_wf_bands(op.file_band_dat, op.ef, op.nproc)
+            bands = wf_bands(kaxis, energies, extra, kpoints, op.ef)
+        labels = [ op.WF_dict[No] for No in op.WF_No ]
+    graphnum = len(bands)
 
+    if op.SAVE_PDF == "" and graphnum <= page_graphnum:
+        projband_page(bands, labels, op, graphnum)
+        with stage('show'):
+            plt.show()
+        return
+
+    #page_graphnum個ずつpageに分け, 1pageずつ描いては書き出す
+    headless()
+    file_out = op.SAVE_PDF or "pjband.pdf"
+    fmt = output_format(file_out)
+    dpi = savefig_dpi(fmt, op.dpi, op.rasterize)
+    starts = range(0, graphnum, page_graphnum)
+    if fmt == 'pdf':
+        from matplotlib.backends.backend_pdf import PdfPages
+        pp = PdfPages(file_out)
+        outs = [ pp ] * len(starts)
+    else:
+        outs = page_files(file_out, len(starts))
+    for s, out in zip(starts, outs):
+        page = slice(s, s+page_graphnum)
+        with stage('page'):
+            fig = projband_page(bands[page], labels[page], \
+                                op, min(graphnum, page_graphnum))
+            with stage('savefig'):
+                fig.savefig(out, format=fmt, dpi=dpi)
+            plt.close(fig)
+    if fmt == 'pdf': pp.close()
+    print("{} graphs, {} pages -> {}".format(graphnum, len(starts), file_out))
+
+if __name__=='__main__': bandplot()
@@ -0,0 +1,428 @@
+import os
+import re
+import array
+import hashlib
+import numpy as np
+
+from qEplot.cache import cached_reader, cached
+from qEplot.profiler import profiled
+
+########################
+# ===== ReadData ===== #
+########################
+
+def read_band_table(file_band, ef=0.0):
+    #band.gnu, _band.datの共通parser
+    #空行区切りのblock(1block=1band)を1回のloadtxtでまとめて読み込む
+    #return: kaxis(nk), energies(nbands, nk), extra(ncol-2, nbands, nk)
+    kaxis, energies, extra = load_band_table(file_band)
+    return kaxis, energies - ef, extra
+
+@cached_reader('band_table')
+def load_band_table(file_band):
+    nk = 0
+    with open(file_band, 'r') as f_band:
+        for line in f_band:
+            if line.strip() == "": break
+            nk += 1
+    table = np.loadtxt(file_band, dtype=np.float64, ndmin=2)
+    if nk == 0 or len(table) % nk != 0:
+        raise ValueError("{}: band blockの長さが揃っていません".format(file_band))
+    table = table.reshape(len(table) // nk, nk, table.shape[1]).transpose(2, 0, 1)
+    kaxis = table[0][0].copy()
+    energies = table[1].copy()
+    extra = np.ascontiguousarray(table[2:])
+    return kaxis, energies, extra
+
+def band_values(kaxis, energies, extra=None):
+    #plottoolに渡す形式: values[n] = [k, E(, weight...)]
+    #(nbands, nk, ncol)の1つのbufferのviewとして返す
+    ncol = 2 if extra is None else 2 + len(extra)
+    buf = np.empty((len(energies), len(kaxis), ncol), dtype=energies.dtype)
+    buf[:, :, 0] = kaxis
+    buf[:, :, 1] = energies
+    if ncol > 2: buf[:, :, 2:] = extra.transpose(1, 2, 0)
+    return buf.transpose(0, 2, 1)
+
+def band_segments(values):
+    #LineCollection用の(nbands, nk, 2)の頂点配列, valuesとbufferを共有する
+    return values.transpose(0, 2, 1)[:, :, :2]
+
+class EnergyIndex:
+    #bandごとのEの最小値, 最大値
+    #select(lo, hi): [lo, hi]と重なるbandだけを返す
+    #bandがE順に並んでいる(emin, emaxが単調)ときはsliceになり, 頂点配列はcopyされない
+    #--watchでbandがまだ1本も無い(energiesが空)ときは何も選ばない
+    def __init__(self, energies):
+        self.emin = energies.min(axis=1, initial=np.inf)
+        self.emax = energies.max(axis=1, initial=-np.inf)
+        self.monotonic = bool(np.all(np.diff(self.emin) >= 0) and np.all(np.diff(self.emax) >= 0))
+
+    def select(self, lo, hi):
+        if self.monotonic:
+            return slice(np.searchsorted(self.emax, lo, 'left'), np.searchsorted(self.emin, hi, 'right'))
+        return np.flatnonzero((self.emax >= lo) & (self.emin <= hi))
+
+@cached_reader('nscf_in')
+def read_nscf_in(file_nscf_in):
+    kpoints_name = []
+    with open(file_nscf_in, 'r') as f_nscf_in:
+        lines = f_nscf_in.readlines()
+    for i, line in enumerate(lines):
+        if "K_POINTS" in line:
+            for j in (range(int(lines[i+1]))):
+                if '!' in lines[i+j+2]:
+                    kpoints_name.append(lines[i+j+2].split('!')[-1])
+            break
+    kpoints_name = [ kn.replace("G", "$\\Gamma$") for kn in kpoints_name ]
+    return kpoints_name
+
+@cached_reader('band_out')
+def read_band_out(file_band_out):
+    kpoints_coord = []
+    with open(file_band_out, "r") as f_band_out:
+        for line in f_band_out:
+            if "high-symmetry point" in line:
+                kpoints_coord.append(float(line.split()[-1]))
+    return kpoints_coord
+
+@cached_reader('labelinfo')
+def read_labelinfo(file_labelinfo):
+    kpoints_name = []
+    kpoints_coord = []
+    with open(file_labelinfo, 'r')  as f_labelinfo:
+        for line in f_labelinfo:
+            kpoints_name.append(line.split()[0])
+            kpoints_coord.append(float(line.split()[2]))
+    kpoints_name = [ kn.replace("G", "$\\Gamma$") for kn in kpoints_name ]
+    return [ kpoints_name, kpoints_coord ]
+
+@cached_reader('pdos')
+def read_pdos_table(file_pdos):
+    #1行目はheader
+    return np.loadtxt(file_pdos, dtype=np.float64, skiprows=1, ndmin=2)
+
+def read_pdos_columns(column_pdos, ef=0.0):
+    #column_pdos: [[file名, enecolumn, doscolumn], ...]
+    #fileごとに1回だけ読み, 列ごとに連続した(ncol, nE)の配列にしてから各系列はその行のviewを返す
+    #efのshiftは(file, enecolumn)ごとに1回だけ
+    tables, energies = {}, {}
+    values = []
+    for file_pdos, enecolumn, doscolumn in column_pdos:
+        if file_pdos not in tables:
+            tables[file_pdos] = np.ascontiguousarray(read_pdos_table(file_pdos).T)
+        table = tables[file_pdos]
+        if (file_pdos, enecolumn) not in energies:
+            energies[(file_pdos, enecolumn)] = table[enecolumn] - ef
+        values.append([ energies[(file_pdos, enecolumn)], table[doscolumn] ])
+    return values
+
+_pdos_atm_name = re.compile(r"pdos_atm#(\d+)\(([^)]+)\)_wfc#(\d+)\(([^)]+)\)")
+
+def pdos_atm_key(file_pdos_atm):
+    #prefix.pdos_atm#N(El)_wfc#M(l) -> (N, El, M, l), spin-orbitの d_j2.5 等は d にまとめる
+    m = _pdos_atm_name.search(os.path.basename(file_pdos_atm))
+    if m is None: raise ValueError("not a pdos_atm file: {}".format(file_pdos_atm))
+    return int(m.group(1)), m.group(2), int(m.group(3)), m.group(4).split('_j')[0]
+
+def pdos_atm_nspin(file_pdos_atm):
+    #headerのldos列の数 = spinの数 (ldos, ldosup/ldosdw, ldos_up/ldos_dw)
+    with open(file_pdos_atm, 'r') as f_pdos:
+        header = f_pdos.readline()
+    return max(1, sum( w.startswith('ldos') for w in header.split() ))
+
+@cached_reader('pdos_atm')
+def aggregate_pdos_atm(*files_pdos_atm):
+    #pdos_atmを1fileずつ読み, (元素, l)ごとのaccumulatorにldosを足していく
+    #memoryはfile数(原子数)によらず (元素, l)の数 x spin x energy点数
+    #return: energy(nE), dos(ngroup, nspin, nE), species(ngroup, 2) [元素, l]
+    species = []
+    group = []
+    for file in files_pdos_atm:
+        _, element, _, l = pdos_atm_key(file)
+        if [element, l] not in species: species.append([element, l])
+        group.append(species.index([element, l]))
+    nspin = pdos_atm_nspin(files_pdos_atm[0])
+    energy = np.loadtxt(files_pdos_atm[0], dtype=np.float64, skiprows=1, usecols=0, ndmin=1)
+    dos = np.zeros((len(species), nspin, len(energy)))
+    for file, g in zip(files_pdos_atm, group):
+        table = np.loadtxt(file, dtype=np.float64, skiprows=1, usecols=range(1, nspin+1), ndmin=2)
+        if table.shape[0] != len(energy):
+            raise ValueError("energy grid of {} differs from {}".format(file, files_pdos_atm[0]))
+        dos[g] += table.T
+    return energy, dos, np.array(species, dtype=str).reshape(-1, 2)
+
+def pdos_groups(energy, dos, species, by='element', ef=0.0):
+    #by='element': 元素ごと, by='orbital': 元素とlごと, spinは足し合わせる
+    #return: labels, [[energy-ef, dos], ...] (Dos.valuesと同じ形)
+    if by not in ('element', 'orbital'):
+        raise ValueError("pdos_by must be element or orbital: {}".format(by))
+    energy = energy - ef
+    total = dos.sum(axis=1)
+    labels = []
+    sums = {}
+    for (element, l), d in zip(species.tolist(), total):
+        label = element if by == 'element' else "{}-{}".format(element, l)
+        if label in sums: sums[label] = sums[label] + d
+        else:
+            labels.append(label)
+            sums[label] = d
+    return labels, [ [ energy, sums[label] ] for label in labels ]
+
+def reverse_lines(f, blocksize=2**16):
+    #binaryで開いたfileをEOFからblocksizeずつ読み, (行頭のoffset, 行)を逆順に返す
+    pos = f.seek(0, 2)
+    rest = b''
+    while pos > 0:
+        size = min(blocksize, pos)
+        pos -= size
+        f.seek(pos)
+        lines = (f.read(size) + rest).split(b'\n')
+        rest = lines[0]
+        end = pos + len(rest)
+        for line in reversed(lines[1:]):
+            end += len(line) + 1
+        for line in reversed(lines[1:]):
+            end -= len(line)
+            yield end, line
+            end -= 1
+    yield 0, rest
+
+_scf_keys = [ (b"!", 'TotalEne', 4), (b"Fermi", 'FermiEne', 4), \
+              (b"total magnetization", 'Totalmag', 3), \
+              (b"absolute magnetization", 'Absolutemag', 3) ]
+
+def _scf_match(line, found):
+    for key, name, col in _scf_keys:
+        if key in line:
+            if name not in found: found[name] = float(line.split()[col])
+            return
+
+def _scan_scf_reverse(f):
+    #"!"とFermiが見つかった時点で終了する
+    #magnetizationは最後の"!"の後に出力されるので, それまでに無ければ無いとみなす
+    found = {}
+    for _, line in reverse_lines(f):
+        _scf_match(line, found)
+        if 'TotalEne' in found and 'FermiEne' in found: break
+    return found
+
+def _scan_scf_forward(f):
+    last = {}
+    for line in f:
+        found = {}
+        _scf_match(line, found)
+        last.update(found)
+    return last
+
+@cached_reader('scf_out')
+def read_scf_out(file_scf_out):
+    #scf.outの最後のtotal energy, Fermi energy, magnetizationを返す
+    #seekできないfileは先頭から順に読む
+    with open(file_scf_out, 'rb') as f_scf_out:
+        if f_scf_out.seekable():
+            found = _scan_scf_reverse(f_scf_out)
+        else:
+            found = _scan_scf_forward(f_scf_out)
+    return tuple( found.get(name, "") for _, name, _ in _scf_keys )
+
+wout_dtype = np.dtype([ ('wf', np.int32), ('centre', np.float64, 3), \
+                        ('spread', np.float64), ('label', 'U64') ])
+_wf_line = re.compile(rb"WF centre and spread\s+(\d+)\s+\(\s*([-\d.]+)\s*,\s*([-\d.]+)\s*,\s*([-\d.]+)\s*\)\s+([-\d.]+)(.*)")
+
+@cached_reader('wout')
+def read_wout_final(file_wout):
+    #.woutの最後の'Final State'をEOFから逆向きに探し, そこから後ろだけを読む
+    #return: WF番号, centre, spread, label(無ければWF<番号>)の構造化配列
+    WF = {}
+    with open(file_wout, 'rb') as f_wout:
+        for offset, line in reverse_lines(f_wout):
+            if b'Final State' in line: break
+        else:
+            return np.empty(0, dtype=wout_dtype)
+        f_wout.seek(offset)
+        for line in f_wout:
+            m = _wf_line.search(line)
+            if m is None: continue
+            No = int(m.group(1))
+            label = "_".join( w.decode() for w in m.group(6).split() ) or "WF{}".format(No)
+            WF[No] = (No, [ float(m.group(i)) for i in (2, 3, 4) ], float(m.group(5)), label)
+    return np.array(list(WF.values()), dtype=wout_dtype)
+
+def read_wout(file_wout):
+    #{WF番号: label}
+    return { int(wf['wf']): str(wf['label']) for wf in read_wout_final(file_wout) }
+
+projwfc_state_dtype = np.dtype([ ('state', 'i4'), ('atom', 'i4'), ('element', 'U8'), \
+                                  ('wfc', 'i4'), ('l', 'i4') ])
+_projwfc_state = re.compile(rb"state #\s*(\d+): atom\s+(\d+) \(\s*([^)\s]+)\s*\)\s*, wfc\s+(\d+) \(l=\s*(\d+)")
+_projwfc_e = re.compile(rb"^\s*(?:=+\s*)?e(?:\(\s*\d+\))?\s*=\s*(-?[\d.]+)\s*eV")
+_projwfc_psi = re.compile(rb"([\d.]+)\*\[#\s*(\d+)\]")
+_l_name = { 's': 0, 'p': 1, 'd': 2, 'f': 3 }
+
+def projwfc_selection(spec):
+    #"Fe:d", "3:p", "O", "d" のような指定 -> (atom番号 or None, 元素 or None, l or None)
+    #','区切りは和, 数字は原子番号, 小文字のs,p,d,fはl, それ以外は元素
+    terms = []
+    for term in spec.split(','):
+        site, _, l = term.strip().partition(':')
+        if l == "" and site in _l_name: site, l = "", site
+        atom = int(site) if site.isdigit() else None
+        element = site if site != "" and atom is None else None
+        if l == "":          l = None
+        elif l in _l_name:   l = _l_name[l]
+        elif l.isdigit():    l = int(l)
+        else: raise ValueError("unknown l: {}".format(spec))
+        terms.append((atom, element, l))
+    return terms
+
+def projwfc_mask(states, spec):
+    #statesのうちspecに入るもの(bool配列)
+    #元素は"Fe1"のような番号付きのspecies名も"Fe"で選べる
+    element = np.char.rstrip(states['element'], '0123456789_')
+    mask = np.zeros(len(states), dtype=bool)
+    for atom, el, l in projwfc_selection(spec):
+        m = np.ones(len(states), dtype=bool)
+        if atom is not None: m &= states['atom'] == atom
+        if el is not None:   m &= (states['element'] == el) | (element == el)
+        if l is not None:    m &= states['l'] == l
+        mask |= m
+    return mask
+
+def read_projwfc(file_projwfc, specs):
+    #projwfc.outを先頭から1回だけ読み, specsごとに選んだstateの|<psi|phi>|^2の和をとる
+    #state x band x kの全体は持たず, bandごとにspecの数だけの和を足していく
+    #return: energies(nbands, nk), weights(len(specs), nbands, nk)
+    #lsdaではk点がup, downの順に2倍並ぶ
+    specs = list(specs)
+    key = hashlib.sha1("\n".join(specs).encode()).hexdigest()[:12]
+    return cached('projwfc-' + key, (file_projwfc,), lambda: _read_projwfc(file_projwfc, specs))
+
+def _read_projwfc(file_projwfc, specs):
+    nsel = len(specs)
+    zeros = [0.0] * nsel
+    states = []
+    selmap = None
+    ene = array.array('d')
+    wgt = array.array('d')
+    nk = 0
+    with open(file_projwfc, 'rb') as f_projwfc:
+        for line in f_projwfc:
+            if selmap is None:
+                m = _projwfc_state.search(line)
+                if m is not None:
+                    states.append(tuple( int(g) if i != 2 else g.decode() for i, g in enumerate(m.groups()) ))
+                    continue
+                if not line.lstrip().startswith(b'k ='): continue
+                #state一覧が終わったので, state番号(bytes) -> 足し込むspecの番号
+                states = np.array(states, dtype=projwfc_state_dtype)
+                masks = [ projwfc_mask(states, spec) for spec in specs ]
+                selmap = {}
+                for i, mask in enumerate(masks):
+                    for st in states['state'][mask]:
+                        selmap.setdefault(str(st).encode(), []).append(i)
+            if b'*[#' in line:
+                base = len(wgt) - nsel
+                for coef, st in _projwfc_psi.findall(line):
+                    for i in selmap.get(st, ()):
+                        wgt[base+i] += float(coef)
+            elif line.lstrip().startswith(b'k ='):
+                nk += 1
+            elif b'eV' in line:
+                m = _projwfc_e.match(line)
+                if m is None: continue
+                ene.append(float(m.group(1)))
+                wgt.extend(zeros)
+            elif b'Lowdin Charges' in line:
+                break
+    if nk == 0 or len(ene) % nk != 0:
+        raise ValueError("{}: k点ごとのband数が揃っていません".format(file_projwfc))
+    nbands = len(ene) // nk
+    energies = np.frombuffer(ene, dtype=np.float64).reshape(nk, nbands).T.copy()
+    weights = np.frombuffer(wgt, dtype=np.float64).reshape(nk, nbands, nsel).transpose(2, 1, 0).copy()
+    return energies, weights
+
+#banddos_plot, banddos_plot_pdf, projband_plotの共通のdata class
+class BandStructure:
+    #kaxis(nk)は共有, energies(nbands, nk)は連続した1つの配列, extra(ncol-2, nbands, nk)はweight等
+    #labels, ticksは高対称点の名前と位置
+    #values(plottool用), segments(LineCollection用)は最初に参照したときに1つのbufferから作る
+    #band(n)はenergiesの行のviewでcopyしない
+    __slots__ = ('ef', 'kaxis', 'energies', 'extra', 'labels', 'ticks', '_values', '_eindex')
+
+    def __init__(self, kaxis, energies, extra=None, labels=(), ticks=(), ef=0.0, dtype=np.float64):
+        self.ef = float(ef)
+        self.kaxis = np.asarray(kaxis, dtype=np.float64)
+        #dtypeが同じならcopyしない(projbandのWFごとの行もview)
+        self.energies = np.asarray(energies, dtype=dtype)
+        self.extra = None if extra is None or len(extra) == 0 else np.asarray(extra, dtype=dtype)
+        self.labels = tuple(labels)
+        self.ticks = np.asarray(ticks, dtype=np.float64)
+        self._values = None
+        self._eindex = None
+
+    def __len__(self):
+        return len(self.energies)
+
+    def band(self, n):
+        return self.energies[n]
+
+    @property
+    def nk(self):
+        return len(self.kaxis)
+
+    @property
+    def kpoints(self):
+        #plottoolに渡す形式 [labels, ticks]
+        return [ list(self.labels), self.ticks ]
+
+    @property
+    def values(self):
+        if self._values is None:
+            self._values = band_values(self.kaxis, self.energies, self.extra)
+        return self._values
+
+    @property
+    def segments(self):
+        return band_segments(self.values)
+
+    @property
+    def eindex(self):
+        if self._eindex is None: self._eindex = EnergyIndex(self.energies)
+        return self._eindex
+
+    def with_kaxis(self, kaxis):
+        #k軸だけ差し替えたもの, energies, extraは共有する
+        return BandStructure(kaxis, self.energies, self.extra, self.labels, self.ticks, \
+                             self.ef, self.energies.dtype)
+
+class QeBand(BandStructure):
+    __slots__ = ()
+
+    @profiled('band parse')
+    def __init__(self, ef, file_nscf_in, file_band_out, file_band_gnu, dtype=np.float64):
+        kaxis, energies, extra = read_band_table(file_band_gnu, float(ef))
+        super().__init__(kaxis, energies, extra, read_nscf_in(file_nscf_in), \
+                         read_band_out(file_band_out), ef, dtype)
+
+class WannierBand(BandStructure):
+    __slots__ = ()
+
+    @profiled('band parse')
+    def __init__(self, ef: float, file_labelinfo, file_band_dat, dtype=np.float64):
+        labels, ticks = read_labelinfo(file_labelinfo)
+        kaxis, energies, extra = read_band_table(file_band_dat, float(ef))
+        super().__init__(kaxis, energies, extra, labels, ticks, ef, dtype)
+
+class Dos:
+    @profiled('dos parse')
+    def __init__(self, ef: float, column_pdos, files_pdos_atm=(), pdos_by=None):
+        #column_pdos: ([ file名1, enecolumn1, doscolumn1 ],[file名2, .....)
+        #pdos_by: 'element' か 'orbital' なら pdos_atm を足し合わせた系列を group_values に持つ
+        self.ef = ef
+        #同じfileは1回だけ読み, 各系列はその列のview
+        self.values = read_pdos_columns(column_pdos, ef)
+        self.group_labels, self.group_values = [], []
+        if pdos_by is not None and len(files_pdos_atm) != 0:
+            energy, dos, species = aggregate_pdos_atm(*sorted(files_pdos_atm))
+            self.group_labels, self.group_values = pdos_groups(energy, dos, species, pdos_by, ef)
@@ -0,0 +1,169 @@
+
+"""
+Usage:
+  scfmonitor.py <path>... [-i <sec>] [-n <ncol>] [--once] [--out <file>] [--dpi <dpi>] [--profile] [--profile-json <file>]
+
+Options:
+  <path>           scf.out, またはscf.outの入っているdir, globも可(複数選択可)
+  -i <sec>         追記を読んで描き直す間隔(秒)  [default: 5]
+  -n <ncol>        1行に並べるjobの数  [default: 4]
+  --once           1回だけ読んで表を出して終了する(--outがあればfileにも描く)
+  --out <file>     画面に出さずfileに書き直す, 拡張子(png, svg, pdf)で形式を決める
+  --dpi <dpi>      pngで保存するときのdpi  [default: 100]
+  --profile        stageごとの時間とmemoryを表で出力する(QEPLOT_PROFILE=1でも可)
+  --profile-json <file>  stageごとの時間とmemoryをjsonに書き出す
+"""
+
+from docopt import docopt
+import os
+import time
+import numpy as np
+
+from qEplot.lazy import plt
+from qEplot.tail import ScfHistory
+from qEplot.batch import expand_dirs
+from qEplot.discovery import Manifest, classify
+from qEplot.profiler import stage, setup as profile_setup
+from qEplot.pagerender import headless, output_format, save_figure
+
+###########################
+# ===== SCF monitor ===== #
+###########################
+#計算中のscf.outを多数まとめて見る
+#各fileはScfHistoryで追記分だけを読み, iterationごとの値を伸びる配列にためる
+#jobごとに1panel: scf accuracyと|ΔE|(Ry, log), 右軸にtotal magnetization
+#値が増えたpanelだけ線のdataを差し替える
+
+finished = ('converged', 'not converged', 'done')
+
+def scf_files(paths):
+    #dirはその中のscf.out, globで拾ったfileは*.scf.outだけ, そのまま書いたfileは名前によらず使う
+    files = []
+    for pattern in paths:
+        for path in expand_dirs([pattern]):
+            if os.path.isdir(path):
+                found = Manifest([path]).all('scf_out')
+            elif path == pattern or classify(os.path.basename(path)) == 'scf_out':
+                found = [ path ]
+            else:
+                found = []
+            files += [ f for f in found if f not in files ]
+    return files
+
+def job_name(file_scf_out):
+    #dir名/file名, 同じprefixのjobを見分ける
+    dir = os.path.basename(os.path.dirname(os.path.abspath(file_scf_out)))
+    return "{}/{}".format(dir, os.path.basename(file_scf_out).replace(".scf.out", ""))
+
+class ScfPanel:
+    #ax=Noneなら描かずに値だけためる(--onceで--outが無いとき)
+    def __init__(self, ax, file_scf_out):
+        self.ax = ax
+        self.name = job_name(file_scf_out)
+        self.scf = ScfHistory(file_scf_out)
+        if ax is None: return
+        self.tmag = ax.twinx()
+        self.l_acc, = ax.semilogy([], [], 'k.-', ms=3, lw=1, label='scf accuracy')
+        self.l_de, = ax.semilogy([], [], 'b.-', ms=3, lw=1, label='|dE|')
+        self.l_mag, = self.tmag.plot([], [], 'r-', lw=1, label='total mag')
+        ax.tick_params(labelsize=7)
+        self.tmag.tick_params(labelsize=7, colors='r')
+
+    def poll(self):
+        return self.scf.poll()
+
+    def age(self):
+        #最後に書かれてから何秒たったか
+        try:
+            return time.time() - os.stat(self.scf.tail.file).st_mtime
+        except OSError:
+            return float('nan')
+
+    def update(self):
+        if self.ax is None: return
+        hist = self.scf.history
+        x = np.arange(1, len(hist)+1)
+        self.l_acc.set_data(x, hist[:, 2])
+        self.l_de.set_data(x[1:], np.abs(np.diff(hist[:, 1])))
+        self.l_mag.set_data(x, hist[:, 3])
+        for ax in (self.ax, self.tmag):
+            ax.relim()
+            ax.autoscale_view()
+        color = { 'converged': 'g', 'not converged': 'r' }.get(self.scf.status, 'k')
+        self.ax.set_title("{}\n{} {} iter".format(self.name, self.scf.status, len(hist)), \
+                          fontsize=8, color=color)
+
+    def summary(self):
+        hist = self.scf.history
+        last = hist[-1] if len(hist) else [np.nan]*5
+        return "{:<30}  {:<13}  {:5d}  {:10.2e}  {:16.8f}  {:8.2f}  {:8.0f}".format( \
+               self.name, self.scf.status, len(hist), last[2], last[1], last[3], self.age())
+
+def print_summary(panels):
+    print("{:<30}  {:<13}  {:>5}  {:>10}  {:>16}  {:>8}  {:>8}".format( \
+          "job", "status", "iter", "acc[Ry]", "E[Ry]", "mag", "age[s]"))
+    for panel in panels: print(panel.summary())
+
+######################
+class monitoroption():
+    def __init__(self):
+        args = docopt(__doc__)
+        profile_setup(args)
+        self.interval = float(args['-i'])
+        self.ncol = int(args['-n'])
+        self.once = args['--once']
+        self.file_out = args['--out']
+        self.dpi = float(args['--dpi'])
+        if self.file_out is not None:
+            output_format(self.file_out)
+        if self.file_out is not None:
+            headless()
+        #--onceで--outが無ければ表だけ出し, matplotlibは読み込まない
+        self.draw = self.file_out is not None or not self.once
+        with stage('discovery'):
+            self.files = scf_files(args['<path>'])
+        if len(self.files) == 0: raise SystemExit("scf.out not found")
+
+def scfmonitor():
+    op = monitoroption()
+    if not op.draw:
+        panels = [ ScfPanel(None, f) for f in op.files ]
+        with stage('poll'):
+            for panel in panels: panel.poll()
+        print_summary(panels)
+        return
+    ncol = min(op.ncol, len(op.files))
+    nrow = -(-len(op.files) // ncol)
+    fig, axes = plt.subplots(nrow, ncol, figsize=(3.2*ncol, 2.4*nrow), squeeze=False)
+    for ax in axes.ravel()[len(op.files):]: ax.set_visible(False)
+    panels = [ ScfPanel(ax, f) for ax, f in zip(axes.ravel(), op.files) ]
+    fig.tight_layout()
+
+    try:
+        while True:
+            with stage('poll'):
+                changed = [ panel for panel in panels if panel.poll() ]
+            if changed:
+                with stage('update'):
+                    for panel in changed: panel.update()
+                if op.file_out is not None:
+                    with stage('savefig'):
+                        save_figure(fig, op.file_out, op.dpi)
+                    print("{}  {} jobs updated -> {}".format(time.strftime('%H:%M:%S'), len(changed), op.file_out))
+            if op.once:
+                print_summary(panels)
+                return
+            if all( panel.scf.status in finished for panel in panels ):
+                print_summary(panels)
+                if op.file_out is None: plt.show()
+                return
+            if op.file_out is None:
+                if changed: fig.canvas.draw_idle()
+                plt.pause(op.interval)
+                if not plt.fignum_exists(fig.number): return
+            else:
+                time.sleep(op.interval)
+    except KeyboardInterrupt:
+        print_summary(panels)
+
+if __name__=='__main__': scfmonitor()
@@ -0,0 +1,200 @@
+import os
+import re
+import numpy as np
+
+from qEplot.readdata import _scf_keys, _scf_match
+
+####################
+# ===== Tail ===== #
+####################
+#計算中に伸びていくfileを, 前回のpollから追記された分だけ読む
+#offsetと行の途中で切れた分(partial)を持ち越すので, 1回のpollの手間は追記量に比例する
+#fileが短くなった, または置き換えられた(inodeが変わった)ときは先頭から読み直す
+#fileがまだ無い(file=None, またはstatできない)ときは何も読まない
+
+class TailReader:
+    def __init__(self, file, from_end=False):
+        self.file = file
+        self.offset = 0
+        self.partial = b''
+        self.ino = None
+        self.restarted = False
+        if from_end: self.skip_to_end()
+
+    def skip_to_end(self):
+        #既に読んだfileの続きだけを見るとき, 最後の改行の後ろから始める
+        if self.file is None: return
+        try:
+            st = os.stat(self.file)
+        except OSError:
+            return
+        self.ino = st.st_ino
+        with open(self.file, 'rb') as f_tail:
+            pos = max(0, st.st_size - 2**16)
+            f_tail.seek(pos)
+            data = f_tail.read(st.st_size - pos)
+        self.offset = st.st_size
+        self.partial = data[data.rfind(b'\n')+1:] if b'\n' in data or pos == 0 else b''
+
+    def poll(self):
+        #return: 新しく完結した行(bytes, 改行なし)のlist
+        #先頭から読み直したときはrestartedをTrueにする(呼び出し側でためた値を捨てる)
+        self.restarted = False
+        if self.file is None: return []
+        try:
+            st = os.stat(self.file)
+        except OSError:
+            return []
+        if st.st_size < self.offset or (self.ino is not None and st.st_ino != self.ino):
+            self.offset, self.partial, self.restarted = 0, b'', True
+        self.ino = st.st_ino
+        if st.st_size == self.offset: return []
+        with open(self.file, 'rb') as f_tail:
+            f_tail.seek(self.offset)
+            data = f_tail.read(st.st_size - self.offset)
+        self.offset += len(data)
+        lines = (self.partial + data).split(b'\n')
+        self.partial = lines.pop()
+        return lines
+
+class Growing:
+    #行を足していく(n, ncol)のfloat配列, 容量を倍々にして1回あたりのcopyをならす
+    def __init__(self, ncol=None):
+        self.ncol = ncol
+        self.buf = None
+        self.n = 0
+
+    def extend(self, rows):
+        rows = np.asarray(rows, dtype=np.float64)
+        if self.buf is None or self.n + len(rows) > len(self.buf):
+            buf = np.empty((max(0 if self.buf is None else 2*len(self.buf), self.n + len(rows), 64), \
+                            rows.shape[1]))
+            if self.n: buf[:self.n] = self.buf[:self.n]
+            self.buf = buf
+        self.buf[self.n:self.n+len(rows)] = rows
+        self.n += len(rows)
+
+    @property
+    def data(self):
+        if self.buf is None: return np.empty((0, self.ncol or 0))
+        return self.buf[:self.n]
+
+class BandTail:
+    #band.gnu, _band.datの追記分だけをparseする
+    #行は(nrow, ncol)のbufferに足していき, 最初の空行までの行数をnkとする
+    #table()は完結したband(nk行)だけをbufferのviewとして返す
+    def __init__(self, file):
+        self.tail = TailReader(file)
+        self.reset()
+
+    def reset(self):
+        self.rows = Growing()
+        self.nk = None
+
+    def poll(self):
+        #return: 完結したbandが増えたか
+        lines = self.tail.poll()
+        if self.tail.restarted: self.reset()
+        if len(lines) == 0: return False
+        nband = self.nband
+        rows = []
+        for line in lines:
+            if line.strip() == b"":
+                if self.nk is None and self.rows.n + len(rows) > 0: self.nk = self.rows.n + len(rows)
+                continue
+            rows.append(line)
+        if len(rows):
+            ncol = len(rows[0].split())
+            self.rows.extend(np.array(b" ".join(rows).split(), dtype=np.float64).reshape(len(rows), ncol))
+        return self.nband != nband
+
+    @property
+    def nband(self):
+        return 0 if self.nk is None else self.rows.n // self.nk
+
+    def table(self):
+        #return: kaxis(nk), energies(nbands, nk), extra(ncol-2, nbands, nk), read_band_tableと同じ形
+        if self.nband == 0:
+            return np.empty(0), np.empty((0, 0)), None
+        table = self.rows.data[:self.nband*self.nk].reshape(self.nband, self.nk, -1).transpose(2, 0, 1)
+        return table[0][0], table[1], table[2:]
+
+class ScfTail:
+    #scf.outの追記分だけを読み, read_scf_outと同じ値(最後に出たもの)を持つ
+    def __init__(self, file, from_end=False, values=None):
+        self.tail = TailReader(file, from_end)
+        self.reset()
+        if values is not None:
+            self.found = { name: v for (_, name, _), v in zip(_scf_keys, values) if v != "" }
+
+    def poll(self):
+        #return: 値が変わったか
+        lines = self.tail.poll()
+        if self.tail.restarted: self.reset()
+        return self.parse(lines)
+
+    def reset(self):
+        self.found = {}
+
+    def parse(self, lines):
+        changed = False
+        for line in lines:
+            found = {}
+            _scf_match(line, found)
+            for name, v in found.items():
+                changed |= self.found.get(name) != v
+                self.found[name] = v
+        return changed
+
+    def values(self):
+        #totE, ef, totM, absM
+        return tuple( self.found.get(name, "") for _, name, _ in _scf_keys )
+
+_scf_iter = re.compile(rb"iteration #\s*(\d+)")
+_scf_energy = re.compile(rb"^\s*total energy\s*=\s*(-?[\d.]+)\s*Ry")
+_scf_accuracy = re.compile(rb"estimated scf accuracy\s*<\s*([-\d.Ee+]+)\s*Ry")
+_scf_mag = re.compile(rb"^\s*(total|absolute) magnetization\s*=\s*([-\d.\s]+?)\s*Bohr")
+_scf_status = [ (b"convergence has been achieved", 'converged'), \
+                (b"convergence NOT achieved", 'not converged'), (b"JOB DONE", 'done') ]
+
+class ScfHistory(ScfTail):
+    #ScfTailに加えて, iterationごとのtotal energy, scf accuracy, magnetizationを伸びる配列にためる
+    #"iteration #"の行で1行足し, その後に出た値で埋める(relaxではiteration番号が1に戻る)
+    #history: (niter, 5) = iteration, energy(Ry), accuracy(Ry), total mag, absolute mag, 無い値はnan
+    columns = ('iteration', 'energy', 'accuracy', 'totmag', 'absmag')
+
+    def reset(self):
+        super().reset()
+        self.rows = Growing(len(self.columns))
+        self.status = 'running'
+
+    @property
+    def history(self):
+        return self.rows.data
+
+    def parse(self, lines):
+        changed = super().parse(lines)
+        hist = self.rows
+        for line in lines:
+            if b'iteration #' in line:
+                hist.extend([[ int(_scf_iter.search(line).group(1)) ] + [np.nan]*4])
+                changed = True
+            elif hist.n == 0:
+                continue
+            elif b'total energy' in line:
+                m = _scf_energy.match(line)
+                if m is not None: hist.buf[hist.n-1, 1] = float(m.group(1))
+            elif b'scf accuracy' in line:
+                m = _scf_accuracy.search(line)
+                if m is not None: hist.buf[hist.n-1, 2] = float(m.group(1))
+            elif b'magnetization' in line:
+                m = _scf_mag.match(line)
+                if m is None: continue
+                #noncollinearのtotal magnetizationは3成分なので大きさにする
+                mag = np.linalg.norm([ float(x) for x in m.group(2).split() ])
+                hist.buf[hist.n-1, 3 if m.group(1) == b'total' else 4] = mag
+            else:
+                for key, status in _scf_status:
+                    if key in line and (status != 'done' or self.status == 'running'):
+                        self.status, changed = status, True
+        return changed
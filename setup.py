@@ -5,10 +5,13 @@ setup(
     name="qEplot",
     version="0.6.2",
     author="Yudai Terao",
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks*']),
     install_requires=[
         'plottool@git+https://github.com/YudaiTerao/plottool.git'
     ],
+    extras_require={
+        'parallel': ['pypdf'],
+    },
     entry_points={
         'console_scripts':[
             'qb = qEplot.banddos_plot:bandplot',
@@ -18,6 +21,9 @@ setup(
             'qbp-pdf = qEplot.banddos_plot_pdf:banddosplot',
             'qbc-pdf = qEplot.banddos_plot_pdf:qbwbplot',
             'pjband = qEplot.projband_plot:bandplot',
+            'qbc-metric = qEplot.bandcompare:metricreport',
+            'qb-batch = qEplot.batch:batchplot',
+            'qe-scfmon = qEplot.scfmonitor:scfmonitor',
         ],
     },
 )
@@ -0,0 +1,8 @@
+import pytest
+
+import qEplot.cache as cache
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    #testでは毎回fileから読む, ~/.cacheにも書かない
+    monkeypatch.setattr(cache, 'enabled', False)
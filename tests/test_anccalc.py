@@ -0,0 +1,86 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip('scipy')
+from scipy.constants import k, e
+
+#arkiv/ANCcalcはpackageではないのでpathを通す
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), \
+                                'qEplot', 'arkiv', 'ANCcalc'))
+import anccalc
+
+#以前のmuごとの3重loop(ancplot.calc_anc), mesh点数だけanccalc.mesh_numに合わせる
+def old_calc_anc(Ene, AHC, T):
+    beta=1/(k*T)
+    L=(Ene[1]-Ene[0])*5
+    ep_mu_max=((anccalc.cosh_cutoff/beta)/e)
+    ep_step=ep_mu_max*2/anccalc.mesh_num
+    ep_mu_mesh=np.arange(-1*ep_mu_max, ep_mu_max, ep_step)
+    df_dep_mesh=[ -1/(2+2*np.cosh(beta*e*(ep_mu))) for ep_mu in ep_mu_mesh ]
+
+    ANC_list=[]
+    for mu in Ene :
+        ep_mesh=[ ep_mu+mu for ep_mu in ep_mu_mesh ]
+        sgm_mesh=[]
+        for ep in ep_mesh:
+            flag=0
+            for i,E in enumerate(Ene):
+                if ep < E :
+                    flag=1
+                    break
+            if ( i == 0 ) and ( flag == 1 ) :
+                a = (AHC[1]-AHC[0])/(Ene[1]-Ene[0])
+                sgm=AHC[0]-a*(Ene[0]-ep)*np.exp(-(Ene[0]-ep)/L)
+            elif ( i == len(Ene)-1 ) and ( flag == 0 ) :
+                a=(AHC[i]-AHC[i-1])/(Ene[i]-Ene[i-1])
+                sgm=AHC[i]+a*(ep-Ene[i])*np.exp(-(ep-Ene[i])/L)
+            else :
+                a=(AHC[i]-AHC[i-1])/(Ene[i]-Ene[i-1])
+                sgm=AHC[i-1]+a*(ep-Ene[i-1])
+            sgm_mesh.append(sgm)
+        ANC=0
+        for i, ep_mu in enumerate(ep_mu_mesh):
+            ANC=ANC+sgm_mesh[i]*ep_mu*df_dep_mesh[i]
+        ANC=ANC*ep_step*beta/T
+        ANC=ANC*100*e
+        ANC_list.append(ANC)
+    return ANC_list
+
+@pytest.fixture(autouse=True)
+def small_mesh(monkeypatch):
+    #3重loopが重いのでmeshを減らす, mu_chunkも小さくしてchunkの継ぎ目を通す
+    monkeypatch.setattr(anccalc, 'mesh_num', 2000)
+    monkeypatch.setattr(anccalc, 'mu_chunk', 7)
+
+def ahc_scan(nE, uniform=True):
+    rng = np.random.default_rng(nE)
+    if uniform: Ene = np.linspace(-0.3, 0.3, nE)
+    else: Ene = np.sort(rng.uniform(-0.3, 0.3, nE))
+    AHC = 200*np.sin(12*Ene) + 50*Ene + rng.normal(0, 5, nE)
+    return Ene, AHC
+
+@pytest.mark.parametrize('T', [ 20.0, 300.0 ])
+@pytest.mark.parametrize('uniform', [ True, False ])
+def test_calc_anc_matches_old_loop(T, uniform):
+    Ene, AHC = ahc_scan(25, uniform)
+    old = np.array(old_calc_anc(Ene, AHC, T))
+    np.testing.assert_allclose(anccalc.calc_anc(Ene, AHC, T), old, rtol=1e-12, atol=1e-12*np.abs(old).max())
+
+@pytest.mark.parametrize('T', [ 20.0, 300.0 ])
+def test_calc_anc_fft_matches_old_loop(T):
+    #FFTはmeshをEneの刻みに揃えるので, 直接積分とは積分点が少しずれる
+    Ene, AHC = ahc_scan(25)
+    old = np.array(old_calc_anc(Ene, AHC, T))
+    np.testing.assert_allclose(anccalc.calc_anc_fft(Ene, AHC, T), old, rtol=0, atol=1e-3*np.abs(old).max())
+
+def test_sweep_anc_non_uniform_falls_back():
+    #等間隔でないgridではfft=TrueでもFFTを使わず直接積分する
+    Ene, AHC = ahc_scan(25, uniform=False)
+    assert not anccalc.is_uniform(Ene)
+    ANC = anccalc.sweep_anc(Ene, AHC, [ 20.0, 300.0 ], processes=1, fft=True)
+    assert ANC.shape == (2, len(Ene))
+    for T, anc in zip([ 20.0, 300.0 ], ANC):
+        np.testing.assert_array_equal(anc, anccalc.calc_anc(Ene, AHC, T))
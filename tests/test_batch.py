@@ -0,0 +1,22 @@
+from qEplot.batch import report_prefixes
+
+def result_dirs(tmp_path, names):
+    dirlist = []
+    for name, prefix in names:
+        dir = tmp_path / name
+        dir.mkdir(parents=True)
+        (dir / "{}.scf.out".format(prefix)).write_text("")
+        dirlist.append(str(dir))
+    return dirlist
+
+def test_report_prefixes_unique(tmp_path):
+    dirlist = result_dirs(tmp_path, [ ("Fe", "Fe"), ("Co", "Co") ])
+    assert report_prefixes(dirlist) == {}
+
+def test_report_prefixes_collision(tmp_path):
+    #同じprefixのdirは上書きし合わないよう別の名前にする, dir名も同じなら番号を付ける
+    dirlist = result_dirs(tmp_path, [ ("Fe", "pwscf"), ("Co", "pwscf"), ("a/run", "Ni"), \
+                                      ("b/run", "Ni"), ("Cu", "Cu") ])
+    prefixes = report_prefixes(dirlist + [ str(tmp_path / "missing") ])
+    assert prefixes == { dirlist[0]: "pwscf_Fe", dirlist[1]: "pwscf_Co", \
+                         dirlist[2]: "Ni_3", dirlist[3]: "Ni_4" }
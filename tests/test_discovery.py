@@ -0,0 +1,28 @@
+import pytest
+
+from qEplot.discovery import peek_calculation, Manifest
+
+@pytest.mark.parametrize('line, calculation', [ \
+    ("  calculation = 'bands'\n", 'bands'), \
+    ("  calculation='bands',\n", 'bands'), \
+    ("  calculation = 'bands', prefix='Fe'\n", 'bands'), \
+    ("  prefix='Fe', calculation = 'bands'\n", 'bands'), \
+    ("  calculation = 'bands' ! band\n", 'bands'), \
+    ("  calculation = \"bands\" ,\n", 'bands'), \
+    ("  CALCULATION = 'nscf'\n", 'nscf'), \
+    ("! calculation = 'bands'\n  calculation = 'scf'\n", 'scf') ])
+def test_peek_calculation(tmp_path, line, calculation):
+    file_in = tmp_path / "Fe.nscf.in"
+    file_in.write_text("&control\n" + line + "  outdir = './'\n/\n&system\n/\n")
+    assert peek_calculation(file_in) == calculation
+
+def test_peek_calculation_outside_control(tmp_path):
+    file_in = tmp_path / "Fe.nscf.in"
+    file_in.write_text("&control\n  prefix = 'Fe'\n/\n&system\n  calculation = 'bands'\n/\n")
+    assert peek_calculation(file_in) is None
+
+def test_manifest_bands_nscf_in(tmp_path):
+    #calculation='bands'のnscf.inだけを高対称点のfileとして拾う
+    (tmp_path / "Fe.nscf.in").write_text("&control\n  calculation = 'bands', prefix='Fe' ! band\n/\n")
+    (tmp_path / "Fe_dos.nscf.in").write_text("&control\n  calculation = 'nscf', prefix='Fe'\n/\n")
+    assert Manifest([ str(tmp_path) ]).all('nscf_in') == [ str(tmp_path / "Fe.nscf.in") ]
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from benchmarks.generate import synthetic_bands, write_band_table, write_nscf_in, write_band_out, \
+                                write_projwfc_out
+import qEplot.readdata as rd
+from qEplot.projband_plot import proj_bands
+
+ef = 5.0
+nk = 24
+nbands = 6
+nat = 4
+proj = [ 'Fe:d', 'O:p' ]
+
+def proj_option(tmp_path, energies_projwfc):
+    #band.gnu, nscf.in, band.out, projwfc.outを書いてplotoptionの代わりを返す
+    prefix = str(tmp_path / "Fe")
+    kaxis, energies = synthetic_bands(nbands, nk)
+    write_band_table(prefix + ".band.gnu", kaxis, energies + ef)
+    write_nscf_in(prefix + ".nscf.in", "Fe", nk)
+    write_band_out(prefix + ".band.out", nk)
+    write_projwfc_out(prefix + ".projwfc.out", energies_projwfc(energies) + ef, nat)
+    return SimpleNamespace(ef=ef, proj=proj, file_nscf_in=prefix + ".nscf.in", \
+                           file_band_out=prefix + ".band.out", file_band_gnu=prefix + ".band.gnu", \
+                           file_projwfc=prefix + ".projwfc.out")
+
+def test_proj_bands(tmp_path):
+    op = proj_option(tmp_path, lambda energies: energies)
+    bands, labels = proj_bands(op)
+    _, weights = rd.read_projwfc(op.file_projwfc, proj)
+    assert labels == proj
+    for bd, w in zip(bands, weights):
+        assert bd.values.shape == (nbands, 3, nk)
+        np.testing.assert_allclose(bd.values[:, 2], w)
+
+def test_proj_bands_lsda(tmp_path):
+    #lsdaのprojwfc.outはk点がup, downの順に2倍並ぶ, spinごとに別のgraphにする
+    op = proj_option(tmp_path, lambda energies: np.concatenate([ energies, energies + 0.5 ], axis=1))
+    bands, labels = proj_bands(op)
+    energies, weights = rd.read_projwfc(op.file_projwfc, proj)
+    assert labels == [ "Fe:d (up)", "Fe:d (down)", "O:p (up)", "O:p (down)" ]
+    qb = rd.QeBand(ef, op.file_nscf_in, op.file_band_out, op.file_band_gnu)
+    for n, bd in enumerate(bands):
+        k = slice(0, nk) if n % 2 == 0 else slice(nk, None)
+        np.testing.assert_array_equal(bd.kaxis, qb.kaxis)
+        np.testing.assert_allclose(bd.values[:, 1], energies[:, k] - ef)
+        np.testing.assert_allclose(bd.values[:, 2], weights[n // 2][:, k])
+    np.testing.assert_allclose(bands[1].energies - bands[0].energies, 0.5, atol=1e-4)
+
+def test_proj_bands_nk_mismatch(tmp_path):
+    op = proj_option(tmp_path, lambda energies: energies[:, :nk-3])
+    with pytest.raises(ValueError):
+        proj_bands(op)
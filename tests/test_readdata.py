@@ -0,0 +1,158 @@
+import numpy as np
+import pytest
+
+import qEplot.readdata as rd
+
+#---- band.gnu, _band.dat ----#
+#以前のsplitで1行ずつ読むparser(QeBand, WannierBand), 空行ごとに1band
+#最後のbandの後ろに空行が無いとそのbandは落ちる
+
+def old_read_band_gnu(file_band_gnu, ef):
+    with open(file_band_gnu, 'r') as f_band_gnu:
+        lines = [ line.split() for line in f_band_gnu.readlines() ]
+    j, values = 0, []
+    for i, line in enumerate(lines):
+        if ( len(line) < 2 ):
+            value = np.array(lines[j:i], dtype=np.float64).T
+            value[1] = value[1] - ef
+            values.append(value)
+            j = i+1
+    return values
+
+def old_read_band_dat(file_band_dat, ef):
+    with open(file_band_dat, 'r') as f_band_dat:
+        lines = [ line.split() for line in f_band_dat.readlines() ]
+    j, values = 0, []
+    for i, line in enumerate(lines):
+        if ( len(line) < 1 ):
+            value = np.array(lines[j:i], dtype=np.float64).T
+            value[1] = value[1] - ef
+            values.append(value)
+            j = i+1
+    return values
+
+def band_text(nbands, nk, ncol, fmt):
+    rng = np.random.default_rng(nbands * nk + ncol)
+    kaxis = np.cumsum(rng.uniform(0.0, 0.1, nk))
+    blocks = []
+    for n in range(nbands):
+        rows = np.column_stack([ kaxis, rng.uniform(-10, 10, nk) + n ] + \
+                               [ rng.uniform(0, 1, nk) for _ in range(ncol-2) ])
+        blocks.append("".join( fmt.format(*row) for row in rows ))
+    return "\n".join(blocks) + "\n"
+
+gnu_fmt = lambda ncol: "{:10.4f}"*ncol + "\n"
+dat_fmt = lambda ncol: "  " + "   ".join([ "{:.8E}" ]*ncol) + "\n"
+
+cases = [ ('Fe.band.gnu', old_read_band_gnu, gnu_fmt), ('Fe_band.dat', old_read_band_dat, dat_fmt) ]
+
+def new_values(file_band, ef):
+    return rd.band_values(*rd.read_band_table(file_band, ef))
+
+@pytest.mark.parametrize('name, old_read, fmt', cases)
+@pytest.mark.parametrize('nbands, nk, ncol', [ (1, 7, 2), (6, 31, 2), (4, 12, 3) ])
+def test_band_table_matches_old_parser(tmp_path, name, old_read, fmt, nbands, nk, ncol):
+    file_band = tmp_path / name
+    file_band.write_text(band_text(nbands, nk, ncol, fmt(ncol)))
+    old = old_read(file_band, 5.25)
+    new = new_values(file_band, 5.25)
+    assert new.shape == (nbands, ncol, nk)
+    assert len(old) == nbands
+    for o, n in zip(old, new):
+        np.testing.assert_array_equal(o, n)
+
+@pytest.mark.parametrize('name, old_read, fmt', cases)
+@pytest.mark.parametrize('ending', [ "", "\n" ])
+def test_band_table_without_trailing_blank(tmp_path, name, old_read, fmt, ending):
+    #最後の空行(と改行)が無くても最後のbandまで読む, 値は空行のあるfileを以前のparserで読んだものと同じ
+    text = band_text(5, 9, 2, fmt(2)).rstrip("\n")
+    file_band = tmp_path / name
+    file_band.write_text(text + ending)
+    file_ref = tmp_path / ("ref" + name)
+    file_ref.write_text(text + "\n\n")
+    old = old_read(file_ref, -1.5)
+    new = new_values(file_band, -1.5)
+    assert len(old) == len(new) == 5
+    for o, n in zip(old, new):
+        np.testing.assert_array_equal(o, n)
+
+def test_band_table_float32(tmp_path):
+    file_band = tmp_path / "Fe.band.gnu"
+    file_band.write_text(band_text(3, 10, 2, gnu_fmt(2)))
+    bd = rd.BandStructure(*rd.read_band_table(file_band, 1.0), dtype=np.float32)
+    old = old_read_band_gnu(file_band, 1.0)
+    assert bd.values.dtype == np.float32
+    for o, n in zip(old, bd.values):
+        np.testing.assert_allclose(o, n, rtol=1e-6, atol=1e-5)
+
+#---- wout ----#
+#以前のparser: 'Final State'の後のWF行を全て読み, 後のblockで上書きする
+#centre, spreadは読んでいなかったので, 同じ行を同じsplitで切って比べる
+
+def old_read_wout(file_wout):
+    with open(file_wout, 'r') as f_wout:
+        lines = f_wout.readlines()
+    flag, WF_dict = 0, {}
+    for line in lines:
+        if 'Final State' in line: flag = 1
+        if 'WF centre and spread' in line and flag == 1:
+            WF_No = int(line.split()[4])
+            if len(line.split()[11:]) == 0:
+                WF_dict[WF_No] = "WF{}".format(WF_No)
+            else :
+                for i, wstr in enumerate(line.split()[11:]):
+                    if i == 0: WF_dict[WF_No] = wstr
+                    else : WF_dict[WF_No] += '_' + wstr
+    return WF_dict
+
+def old_wout_values(file_wout):
+    #{WF番号: (centre, spread)}, 最後に出た値
+    values = {}
+    with open(file_wout, 'r') as f_wout:
+        for line in f_wout:
+            if 'WF centre and spread' not in line: continue
+            w = line.split()
+            values[int(w[4])] = ([ float(x.strip(',')) for x in w[6:9] ], float(w[10]))
+    return values
+
+def wf_line(No, centre, spread, label=""):
+    return "  WF centre and spread {:4d}  ({:10.6f},{:10.6f},{:10.6f} ) {:14.8f}  {}\n".format( \
+           No, *centre, spread, label).rstrip() + "\n"
+
+def wout_text(blocks):
+    #blocks: [ [(No, centre, spread, label), ...], ... ], 最初のblockはiteration中, 残りはFinal State
+    text = " Wannierisation convergence criteria satisfied\n"
+    for i, block in enumerate(blocks):
+        text += "\n Final State\n" if i > 0 else "\n Iter     1\n"
+        text += "".join( wf_line(*wf) for wf in block )
+        text += "  Sum of centres and spreads (  0.000000,  0.000000,  0.000000 )     1.00000000\n"
+    return text + "\n All done: wannier90 exiting\n"
+
+def wf_block(seed, labels):
+    rng = np.random.default_rng(seed)
+    return [ (n+1, rng.uniform(-9, 9, 3), rng.uniform(-2, 5), label) for n, label in enumerate(labels) ]
+
+wout_labels = [ [ "Fe d", "Fe d", "O p", "", "" ], [ "", "", "", "", "" ], [ "Fe_dxy", "t2g up", "s", "O p z", "" ] ]
+
+@pytest.mark.parametrize('labels', wout_labels)
+@pytest.mark.parametrize('nfinal', [ 1, 3 ])
+def test_read_wout_matches_old_parser(tmp_path, labels, nfinal):
+    blocks = [ wf_block(0, [ "iter" ]*len(labels)) ] + \
+             [ wf_block(i+1, labels if i == nfinal-1 else [ "old" ]*len(labels)) for i in range(nfinal) ]
+    file_wout = tmp_path / "Fe.wout"
+    file_wout.write_text(wout_text(blocks))
+    assert rd.read_wout(file_wout) == old_read_wout(file_wout)
+
+    final = rd.read_wout_final(file_wout)
+    old = old_wout_values(file_wout)
+    assert list(final['wf']) == sorted(old)
+    for wf in final:
+        centre, spread = old[int(wf['wf'])]
+        np.testing.assert_array_equal(wf['centre'], centre)
+        assert wf['spread'] == spread
+    assert np.any(final['centre'] < 0) and np.any(final['spread'] < 0)
+
+def test_read_wout_without_final_state(tmp_path):
+    file_wout = tmp_path / "Fe.wout"
+    file_wout.write_text(wout_text([ wf_block(0, [ "" ]*3) ]))
+    assert rd.read_wout(file_wout) == old_read_wout(file_wout) == {}
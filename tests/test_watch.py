@@ -0,0 +1,81 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from qEplot.readdata import EnergyIndex
+from qEplot.banddos_plot import BandWatch
+from qEplot.bandlines import BandLineUpdate
+
+#--watchをbands.xより先に起動したとき: band fileが無い, 空, 1本目のbandが途中まで
+
+nk = 5
+nscf_in = """&control
+  calculation = 'bands'
+/
+&system
+/
+"""
+
+def band_block(n):
+    return "".join( "{:10.4f}{:10.4f}\n".format(0.1*k, n + 0.01*k) for k in range(nk) ) + "\n"
+
+@pytest.fixture
+def result_dir(tmp_path):
+    (tmp_path / "Fe.nscf.in").write_text(nscf_in)
+    return tmp_path
+
+def watch_option(dir, file_band_gnu=None):
+    return SimpleNamespace(dirlist=[ str(dir) ], ef=0.0, dtype=np.float64, \
+                           file_nscf_in=None, file_band_out=None, file_band_gnu=file_band_gnu, \
+                           file_band_dat=None, file_labelinfo=None)
+
+def test_energy_index_empty():
+    eindex = EnergyIndex(np.empty((0, 0)))
+    assert len(eindex.emin) == 0 and len(eindex.emax) == 0
+    assert len(np.arange(0)[eindex.select(-1.0, 1.0)]) == 0
+
+def test_watch_before_band_file(result_dir):
+    watch = BandWatch(watch_option(result_dir), False)
+    assert not watch.poll()
+    bd = watch.bands()
+    assert len(bd) == 0
+    assert len(bd.segments[bd.eindex.select(-10.0, 10.0)]) == 0
+
+    #bands.xがfileを作ったら見つけて読み始める
+    file_band_gnu = result_dir / "Fe.band.gnu"
+    file_band_gnu.write_text(band_block(0))
+    assert watch.poll()
+    assert len(watch.bands()) == 1
+    assert watch.op.file_nscf_in == str(result_dir / "Fe.nscf.in")
+
+@pytest.mark.parametrize('text', [ "", band_block(0)[:25], band_block(0)[:-1] ])
+def test_watch_partial_band_file(result_dir, text):
+    file_band_gnu = result_dir / "Fe.band.gnu"
+    file_band_gnu.write_text(text)
+    watch = BandWatch(watch_option(result_dir, str(file_band_gnu)), False)
+    watch.poll()
+    assert len(watch.bands()) == 0
+
+    with open(file_band_gnu, 'a') as f_band_gnu:
+        f_band_gnu.write(band_block(0)[len(text):] + band_block(1))
+    assert watch.poll()
+    bd = watch.bands()
+    assert len(bd) == 2
+    assert np.allclose(bd.band(1), 1 + 0.01*np.arange(nk))
+
+def test_band_line_update_empty(result_dir):
+    from matplotlib.figure import Figure
+    from matplotlib.collections import LineCollection
+    ax = Figure().add_subplot()
+    ax.set_ylim(-5, 5)
+    lc = LineCollection([ [(0, 0), (1, 1)] ])
+    watch = BandWatch(watch_option(result_dir), False)
+    watch.poll()
+    BandLineUpdate(ax, lc, watch.bands(), 'black')
+    assert len(lc.get_segments()) == 0
+
+    (result_dir / "Fe.band.gnu").write_text(band_block(0) + band_block(1))
+    watch.poll()
+    BandLineUpdate(ax, lc, watch.bands(), 'black')
+    assert len(lc.get_segments()) == 2